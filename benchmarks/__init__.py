@@ -0,0 +1,90 @@
+"""
+Throughput benchmarks for rest. They run offline against the package in this
+checkout. Each `bench_*` module has a `run()` returning {name: seconds per
+call} and can be run on its own, eg:
+
+  python -m benchmarks.bench_json
+
+or all together, saving and comparing against a stored baseline:
+
+  python -m benchmarks run
+  python -m benchmarks save [--baseline benchmarks/baseline.json]
+  python -m benchmarks compare [--baseline ...] [--threshold 0.1]
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import importlib
+import json
+import os
+import timeit
+
+
+MODULES = (
+  'bench_schema',
+  'bench_encoding',
+  'bench_json',
+  'bench_csv',
+  'bench_csv_reader',
+  'bench_xml',
+  'bench_validators',
+)
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def measure(func, repeat=5):
+  """
+  Seconds per call of `func`, the best of `repeat` timed runs. Each run makes
+  enough calls to take at least 0.2s.
+  """
+  timer = timeit.Timer(func)
+  number, _ = timer.autorange()
+  return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def report(results):
+  """
+  Print a table of {name: seconds per call}.
+  """
+  width = max(len(name) for name in results)
+  for name, seconds in sorted(results.items()):
+    print('%-*s  %12.2f ops/s  %10.3f us/op' % (width, name, 1.0 / seconds,
+                                                 seconds * 1e6))
+
+def run_all(modules=MODULES):
+  results = {}
+  for name in modules:
+    module = importlib.import_module('benchmarks.%s' % name)
+    results.update(module.run())
+  return results
+
+def save(results, path=BASELINE):
+  with open(path, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+    f.write('\n')
+
+def load(path=BASELINE):
+  with open(path) as f:
+    return json.load(f)
+
+def compare(results, baseline, threshold=0.1):
+  """
+  Print how each result moved against `baseline`, and return the names of the
+  benchmarks which got slower by more than `threshold` (a fraction), or have
+  no baseline to compare with - save one again when adding a benchmark.
+  """
+  regressions = []
+  width = max(len(name) for name in results)
+  for name, seconds in sorted(results.items()):
+    if name not in baseline:
+      print('%-*s  %10.3f us/op  NO BASELINE' % (width, name, seconds * 1e6))
+      regressions.append(name)
+      continue
+
+    change = seconds / baseline[name] - 1
+    flag = ''
+    if change > threshold:
+      flag = '  REGRESSION'
+      regressions.append(name)
+    print('%-*s  %10.3f us/op  %+7.1f%%%s' % (width, name, seconds * 1e6,
+                                               change * 100, flag))
+  return regressions
@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+from __future__ import print_function
+import argparse
+import sys
+
+import benchmarks
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog='python -m benchmarks')
+  parser.add_argument('command', choices=('run', 'save', 'compare'))
+  parser.add_argument('modules', nargs='*', default=benchmarks.MODULES,
+    help='benchmark modules to run (default: all)')
+  parser.add_argument('--baseline', default=benchmarks.BASELINE)
+  parser.add_argument('--threshold', type=float, default=0.1,
+    help='fractional slow-down reported as a regression (default: 0.1)')
+  args = parser.parse_args(argv)
+
+  results = benchmarks.run_all(args.modules)
+
+  if args.command == 'run':
+    benchmarks.report(results)
+  elif args.command == 'save':
+    benchmarks.report(results)
+    benchmarks.save(results, args.baseline)
+  else:
+    regressions = benchmarks.compare(results, benchmarks.load(args.baseline),
+                                     args.threshold)
+    if regressions:
+      print('%d regression(s) or benchmark(s) missing from the baseline'
+            % len(regressions))
+      return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
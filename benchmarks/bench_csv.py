@@ -0,0 +1,95 @@
+"""
+`csv_upload` and `json_csv_upload` end to end, through a Flask test client.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import json
+
+import flask
+import six
+
+import rest
+
+from benchmarks import measure
+from benchmarks import report
+
+
+ROWS = 1000
+
+FIELDNAMES = ('dog_type', 'food', 'pounds')
+
+
+class DogSchema(rest.Schema):
+  dog_type = rest.String(validators=[rest.nonempty])
+  food     = rest.String(validators=[rest.nonempty])
+  pounds   = rest.Int()
+
+
+def csv_body(rows=ROWS, header=True):
+  lines = [','.join(FIELDNAMES)] if header else []
+  lines.extend('dog %d,kibble,%d' % (i, i) for i in range(rows))
+  return '\n'.join(lines) + '\n'
+
+
+def app():
+  app = flask.Flask(__name__)
+
+  @app.route('/csv', methods=['POST'])
+  @rest.csv_upload(DogSchema)
+  def csv(rows):
+    count = 0
+    for schema in rows:
+      count += 1
+    return rest.created({'rows': count})
+
+  @app.route('/csv_batches', methods=['POST'])
+  @rest.csv_upload(DogSchema, batch_size=500)
+  def csv_batches(rows):
+    count = 0
+    for batch in rows:
+      count += len(batch)
+    return rest.created({'rows': count})
+
+  @app.route('/json_csv', methods=['POST'])
+  @rest.json_csv_upload(FIELDNAMES)
+  def json_csv(rows, data):
+    count = 0
+    for row, row_number, errors in rows:
+      count += 1
+    return rest.created({'rows': count})
+
+  return app
+
+
+def run():
+  client = app().test_client()
+  csv_data = csv_body().encode('utf-8')
+  json_data = json.dumps({'csv': csv_body(header=False)})
+
+  def post_csv():
+    return client.post('/csv', headers={'content-type': 'multipart/form-data'},
+      data={'file': (six.BytesIO(csv_data), 'dogs.csv')})
+
+  def post_csv_batches():
+    return client.post('/csv_batches',
+      headers={'content-type': 'multipart/form-data'},
+      data={'file': (six.BytesIO(csv_data), 'dogs.csv')})
+
+  def post_json_csv():
+    return client.post('/json_csv', data=json_data,
+      headers={'content-type': 'application/json'})
+
+  assert post_csv().status_code == 201
+  assert post_csv_batches().status_code == 201
+  assert post_json_csv().status_code == 201
+
+  return {
+    'csv.csv_upload.%d_rows' % ROWS:      measure(post_csv),
+    'csv.csv_upload_batches.%d_rows' % ROWS:
+      measure(post_csv_batches),
+    'csv.json_csv_upload.%d_rows' % ROWS: measure(post_json_csv),
+  }
+
+
+if __name__ == '__main__':
+  report(run())
@@ -0,0 +1,69 @@
+"""
+Reading a large CSV file, with the unicodecsv `DictReader` `csv_upload` used to
+read uploads through against `rest.ingest.csv_rows`. Set BENCH_CSV_MB to change
+the size of the file from 100MB.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import tempfile
+
+import unicodecsv
+
+from rest import ingest
+
+from benchmarks import measure
+from benchmarks import report
+
+
+MEGABYTES = int(os.environ.get('BENCH_CSV_MB', 100))
+
+FIELDNAMES = ('dog_type', 'food', 'pounds', 'price', 'adopted')
+
+
+def write_csv(f, megabytes=MEGABYTES):
+  """
+  Write a header and rows to `f` until it holds `megabytes` of CSV, returning
+  the number of rows.
+  """
+  f.write((','.join(FIELDNAMES) + '\n').encode('utf-8'))
+  size = megabytes * 1024 * 1024
+  rows = 0
+  while f.tell() < size:
+    lines = [u'dog %d,"kibble, dry",%d,%d.99,true\n' % (i, i % 200, i % 50)
+             for i in range(rows, rows + 10000)]
+    f.write(u''.join(lines).encode('utf-8'))
+    rows += len(lines)
+  f.flush()
+  return rows
+
+
+def run():
+  with tempfile.NamedTemporaryFile(suffix='.csv') as f:
+    rows = write_csv(f)
+
+    def dict_reader():
+      with open(f.name, 'rb') as upload:
+        for row in unicodecsv.DictReader(upload):
+          pass
+
+    def csv_rows():
+      with open(f.name, 'rb') as upload:
+        fieldnames, reader = ingest.csv_rows(ingest.upload_file(upload))
+        for row in reader:
+          pass
+
+    results = {
+      'csv_reader.unicodecsv_dictreader.%dmb' % MEGABYTES:
+        measure(dict_reader, repeat=1),
+      'csv_reader.csv_rows.%dmb' % MEGABYTES:
+        measure(csv_rows, repeat=1),
+    }
+
+  for name, seconds in sorted(results.items()):
+    print('%s  %12.0f rows/s' % (name, rows / seconds))
+  return results
+
+
+if __name__ == '__main__':
+  report(run())
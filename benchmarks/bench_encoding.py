@@ -0,0 +1,54 @@
+"""
+JSON and XML codecs encoding a list of schemas and decoding a request body.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import flask
+
+from rest.encoding import JsonEncoding
+from rest.encoding import XmlEncoding
+
+from benchmarks import measure
+from benchmarks import report
+from benchmarks.bench_json import CampaignSchema
+
+
+ITEMS = 1000
+
+
+def schemas(count=ITEMS):
+  return [CampaignSchema(
+    id        = 'campaign-%d' % i,
+    name      = 'Campaign %d' % i,
+    budget    = '1500.25',
+    bid       = 2.5,
+    active    = bool(i % 2),
+    starts_at = '2012-04-20T16:20:01Z',
+    tags      = ['outdoor', 'digital']) for i in range(count)]
+
+
+def run():
+  app = flask.Flask(__name__)
+  items = schemas()
+  results = {}
+
+  for name, codec in (('json', JsonEncoding('body')),
+                      ('xml',  XmlEncoding('body'))):
+    results['encoding.%s.encode' % name] = measure(
+      lambda: codec.dumps([codec.simplify(i) for i in items]))
+    results['encoding.%s.iter_encode' % name] = measure(
+      lambda: list(codec.iter_encode(items)))
+
+    body = codec.dumps(codec.simplify(items[0]))
+    with app.test_request_context('/', method='POST', data=body):
+      request = flask.request._get_current_object()
+      request.get_data()
+      results['encoding.%s.decode' % name] = measure(
+        lambda: codec.decode(request))
+
+  return results
+
+
+if __name__ == '__main__':
+  report(run())
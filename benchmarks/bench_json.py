@@ -0,0 +1,63 @@
+"""
+Encode and decode throughput of every installed JSON backend, on a list of
+simplified schemas like a list endpoint would return.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+from datetime import datetime
+from decimal import Decimal
+
+import rest
+from rest import json_backend
+from rest.encoding import JsonEncoding
+
+from benchmarks import measure
+from benchmarks import report
+
+
+class CampaignSchema(rest.Schema):
+  id        = rest.String()
+  name      = rest.String()
+  budget    = rest.Dollars()
+  bid       = rest.Float()
+  active    = rest.Bool()
+  starts_at = rest.DateTime()
+  tags      = rest.List()
+
+
+def payload(count=1000):
+  items = []
+  for i in range(count):
+    schema = CampaignSchema(
+      id        = 'campaign-%d' % i,
+      name      = u'Campaign \u2019%d' % i,
+      budget    = Decimal('1500.25'),
+      bid       = 2.5,
+      active    = bool(i % 2),
+      starts_at = '2012-04-20T16:20:01Z',
+      tags      = ['outdoor', 'digital'])
+    item = schema._get(namespace=False)
+    item['spend'] = Decimal('12.75')
+    item['updated_at'] = datetime(2012, 4, 20, 16, 20, 1)
+    items.append(item)
+  return items
+
+
+def run(count=1000):
+  items = payload(count)
+  results = {}
+  for backend in json_backend.available():
+    codec = JsonEncoding('body')
+    codec.backend = backend
+    encoded = codec.encode(items)
+
+    results['json.%s.encode' % backend.name] = \
+        measure(lambda: codec.encode(items))
+    results['json.%s.decode' % backend.name] = \
+        measure(lambda: backend.loads(encoded))
+  return results
+
+
+if __name__ == '__main__':
+  print('%d schemas per payload' % 1000)
+  report(run())
@@ -0,0 +1,71 @@
+"""
+Schema construction, validation and serialization, on a small schema and on a
+wide one.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+
+import rest
+
+from benchmarks import measure
+from benchmarks import report
+from benchmarks.bench_json import CampaignSchema
+
+
+class SmallSchema(rest.Schema):
+  name   = rest.String(validators=[rest.required, rest.length(max=64)])
+  email  = rest.Email()
+  pounds = rest.Int()
+
+
+WIDE_FIELDS = 50
+
+WideSchema = type('WideSchema', (rest.Schema,), dict(
+  [('text_%02d' % i, rest.String(validators=[rest.nonempty]))
+    for i in range(0, WIDE_FIELDS, 2)] +
+  [('count_%02d' % i, rest.Int(validators=[rest.number_range(min=0)]))
+    for i in range(1, WIDE_FIELDS, 2)]))
+
+
+SMALL_ROW = {'name': 'shibe', 'email': 'doge@example.com', 'pounds': '20'}
+
+WIDE_ROW = dict(
+  [('text_%02d' % i, 'value %d' % i) for i in range(0, WIDE_FIELDS, 2)] +
+  [('count_%02d' % i, str(i)) for i in range(1, WIDE_FIELDS, 2)])
+
+
+def run():
+  small = SmallSchema()
+  small(SMALL_ROW)
+  wide = WideSchema()
+  wide(WIDE_ROW)
+
+  campaign = CampaignSchema(
+    id        = 'campaign-1',
+    name      = 'Campaign 1',
+    budget    = '1500.25',
+    bid       = 2.5,
+    active    = True,
+    starts_at = '2012-04-20T16:20:01Z',
+    tags      = ['outdoor', 'digital'])
+
+  small_rows = [SMALL_ROW] * 1000
+  wide_rows = [WIDE_ROW] * 1000
+
+  return {
+    'schema.small.construct':     measure(SmallSchema),
+    'schema.small.call':          measure(lambda: SmallSchema()(SMALL_ROW)),
+    'schema.small.get':           measure(small._get),
+    'schema.small.validate_many': measure(
+      lambda: SmallSchema.validate_many(small_rows)),
+    'schema.campaign.get':        measure(campaign._get),
+    'schema.wide.construct':      measure(WideSchema),
+    'schema.wide.call':           measure(lambda: WideSchema()(WIDE_ROW)),
+    'schema.wide.get':            measure(wide._get),
+    'schema.wide.validate_many':  measure(
+      lambda: WideSchema.validate_many(wide_rows)),
+  }
+
+
+if __name__ == '__main__':
+  report(run())
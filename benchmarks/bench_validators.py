@@ -0,0 +1,106 @@
+"""
+Validating a wide schema's fields, calling each validator in turn as
+`Field.validate` used to against the fused check it calls now, and the `url`
+and `email` validators over a million values against `re.search` with the
+pattern string, as they used to call it. Set BENCH_VALUES to change how many.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+import re
+
+import rest
+
+from benchmarks import measure
+from benchmarks import report
+
+
+WIDE_FIELDS = 50
+
+VALUES = int(os.environ.get('BENCH_VALUES', 1000000))
+
+URL_PATTERN = r'^http(s)?://([^/:]+\.[a-z]{2,10}|' + \
+  r'([0-9]{1,3}\.){3}[0-9]{1,3})(:[0-9]+)?(\/.*)?$'
+
+EMAIL_PATTERN = r'(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)'
+
+COLORS = ['red', 'green', 'blue', 'black', 'white']
+
+ValidatedSchema = type('ValidatedSchema', (rest.Schema,), dict(
+  [('name_%02d' % i, rest.String(validators=[
+      rest.required, rest.length(min=1, max=64),
+      rest.regex(r'^[a-z ]+$', 'lowercase only')]))
+    for i in range(0, WIDE_FIELDS, 2)] +
+  [('color_%02d' % i, rest.String(validators=[
+      rest.required, rest.multiple_choice(COLORS)]))
+    for i in range(1, WIDE_FIELDS, 2)]))
+
+ROW = dict(
+  [('name_%02d' % i, 'value') for i in range(0, WIDE_FIELDS, 2)] +
+  [('color_%02d' % i, COLORS[i % len(COLORS)])
+    for i in range(1, WIDE_FIELDS, 2)])
+
+
+def values(valid, invalid, count=VALUES):
+  """
+  `count` values, a quarter of them valid and the rest from `invalid`.
+  """
+  pool = [valid] + invalid
+  return [pool[i % len(pool)] for i in range(count)]
+
+
+def run():
+  urls = values('https://example.com/dogs?id=1',
+                ['example.com/dogs', 'not a url', 'www.example.com'])
+  emails = values('doge@example.com',
+                  ['doge', 'not an email', 'doge.example.com'])
+
+  def each(validate, values):
+    def run():
+      for value in values:
+        validate(value)
+    return run
+
+  # regex as it was, searching with the pattern string on every call
+  def re_search(pattern, msg):
+    def validate(value):
+      if value and not re.search(pattern, value):
+        return [msg]
+    return validate
+
+  old_url = re_search(URL_PATTERN, 'must be a valid HTTP URL')
+  old_email = re_search(EMAIL_PATTERN, 'must be a valid email')
+
+  schema = ValidatedSchema()
+  schema(ROW)
+  fields = schema._values
+
+  def each_validator():
+    for field in fields:
+      value = field.get()
+      errors = []
+      for validator in field._validators:
+        error = validator(value)
+        if error:
+          errors += error
+
+  def fused():
+    for field in fields:
+      field.validate()
+
+  results = {
+    'validators.wide.each_validator': measure(each_validator),
+    'validators.wide.fused':          measure(fused),
+    'validators.wide.call':           measure(lambda: ValidatedSchema()(ROW)),
+  }
+  for name, validate, inputs in [('url.re_search', old_url, urls),
+                                 ('url', rest.url, urls),
+                                 ('email.re_search', old_email, emails),
+                                 ('email', rest.email, emails)]:
+    results['validators.%s.%d_values' % (name, VALUES)] = \
+      measure(each(validate, inputs), repeat=1)
+  return results
+
+
+if __name__ == '__main__':
+  report(run())
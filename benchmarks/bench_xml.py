@@ -0,0 +1,52 @@
+"""
+Decoding deep and wide XML documents: `XmlEncoding.etree_to_dict` over a
+parsed tree against `rest.xml_decode`, with the stdlib parser and with lxml
+when it's installed.
+"""
+from __future__ import absolute_import
+from __future__ import print_function
+import os
+
+from xml.etree import ElementTree
+
+from rest import xml_decode
+from rest.encoding import XmlEncoding
+
+from benchmarks import measure
+from benchmarks import report
+
+
+def wide(items=2000):
+  return ('<body>%s</body>' % ''.join(
+    '<item id="%d"><name>Campaign %d</name><budget>1500.25</budget>'
+    '<tag>outdoor</tag><tag>digital</tag></item>' % (i, i)
+    for i in range(items))).encode('utf-8')
+
+def deep(depth=200, repeat=20):
+  nested = '<level n="1">' * depth + 'bottom' + '</level>' * depth
+  return ('<body>%s</body>' % (nested * repeat)).encode('utf-8')
+
+
+def run():
+  codec = XmlEncoding('body')
+  parsers = ['etree']
+  if xml_decode.lxml_etree is not None:
+    parsers.append('lxml')
+
+  results = {}
+  for shape, doc in (('wide', wide()), ('deep', deep())):
+    results['xml.%s.etree_to_dict' % shape] = measure(
+      lambda: codec.etree_to_dict(ElementTree.XML(doc)))
+
+    for parser in parsers:
+      os.environ['REST_XML_PARSER'] = parser
+      try:
+        results['xml.%s.xml_decode.%s' % (shape, parser)] = measure(
+          lambda: xml_decode.loads(doc))
+      finally:
+        del os.environ['REST_XML_PARSER']
+  return results
+
+
+if __name__ == '__main__':
+  report(run())
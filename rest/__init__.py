@@ -1,10 +1,11 @@
 from __future__ import absolute_import
+import hashlib
+
 import flask
-import unicodecsv as csv
-import six
 
 from flask import Response
 from functools import wraps
+from itertools import chain
 from werkzeug.wrappers import BaseResponse
 
 from .schema import Schema
@@ -38,53 +39,102 @@ from .validators import regex
 from .validators import required
 from .validators import url
 
+from . import compression
+
+from .cache import ResponseCache
+
+from .encoding import NestedXmlEncoding
+from .encoding import XmlEncoding
 from .encoding import encoder
 
+from .ingest import CsvValidationError
+from .ingest import MAX_REPORTED_ERRORS
+from .ingest import PARALLEL_THRESHOLD
+from .ingest import chunked_file
+from .ingest import collect_csv_errors
+from .ingest import csv_reader
+from .ingest import csv_rows
+from .ingest import parallel_rows
+from .ingest import text_file
+from .ingest import upload_file
+from .ingest import validate_batches
+from .ingest import validate_rows
 
-class CsvValidationError(ValueError):
+from .json_stream import JsonStreamError
+from .json_stream import stream_member
 
-  def __init__(self, message, schema):
-    self.schema = schema
-    super(CsvValidationError, self).__init__(message)
+from .limits import LimitExceeded
+from .limits import Limits
+
+
+def view(func=None, stream=False, decode=True, limits=None, etag=False,
+    cache=None, compress=False):
+  """
+  decode the request body into the `data` argument for POST and PUT, and
+  encode whatever the view returns with the codec negotiated for the request
+
+  with `stream=True`, lists are sent as a chunked response which encodes
+  items as they are pulled from the iterable the view returns, so the full
+  list is never held in memory. use as `@rest.view(stream=True)`
+
+  with `decode=False`, the body is left unread for the view to read itself
+
+  with `limits=rest.Limits(...)`, the body is checked against them while it is
+  read and decoded. one over a limit is turned away with HTTP 413 as soon as
+  it's found, without being read any further
+
+  with `etag=True`, GET responses carry an ETag hashed from the encoded body,
+  and a request whose If-None-Match matches it gets HTTP 304 with no body.
+  `etag` may instead be a function taking the view's arguments and returning
+  a cheap version of what it would return - then a matching request gets its
+  304 without the view being called at all
+
+  with `cache=rest.ResponseCache(...)`, encoded GET responses are kept in the
+  cache keyed on the path, query string, negotiated codec and version (if
+  `etag` is a function), and served from it until they're evicted or expire
+
+  with `compress=True`, responses of at least `compression.MIN_SIZE` bytes are
+  compressed with the best of brotli (if installed), gzip or deflate the
+  client accepts. streamed responses are compressed as they're sent, and
+  cached ones are compressed once per encoding. pass a number of bytes
+  instead of True to set the minimum size
+  """
+  if func is None:
+    return lambda func: view(func, stream=stream, decode=decode, limits=limits,
+                             etag=etag, cache=cache, compress=compress)
 
+  min_size = compression.MIN_SIZE if compress is True else compress
 
-def view(func):
   @wraps(func)
   def wrapped(*args, **kwargs):
+    if not compress:
+      return respond(None, args, kwargs)
+
+    encoding = compression.negotiate(flask.request)
+    response = flask.make_response(respond(encoding, args, kwargs))
+    return compression.compress_response(response, encoding, min_size)
+
+  def respond(encoding, args, kwargs):
     request = flask.request
     codec   = encoder(request)
-    if request.method in ['POST', 'PUT']:
-      # check for multipart form data. this will be submitted with the jquery
-      # forms plugin, which makes the request slightly different from
-      # the backbone request.
-      #
-      # right now, since we're only accepting CSV files as upload this way,
-      # we don't need to save the file anywhere, but we'll simply add the files
-      # to the data hash keyed with the name values.
-      if 'CONTENT_TYPE' in request.environ \
-          and ('multipart/form-data' in request.environ['CONTENT_TYPE']
-            or 'application/x-www-form-urlencoded' \
-              in request.environ['CONTENT_TYPE']):
-        data = request.form.copy()
-        data.update(request.files)
-        kwargs['data'] = data
-      else:
-        try:
-          kwargs['data'] = codec.decode(request)
-        except Exception as e:
-          return error({
-            'client': [str(e)]
-          })
-    return _serialize(func(*args, **kwargs))
+    if decode and request.method in ['POST', 'PUT']:
+      try:
+        kwargs['data'] = _decode(request, codec, limits)
+      except LimitExceeded as e:
+        return error({'client': [str(e)]}, 413)
+      except Exception as e:
+        return error({
+          'client': [str(e)]
+        })
+    elif (etag or cache is not None) and request.method in ['GET', 'HEAD']:
+      return _conditional(func, args, kwargs, codec, stream, etag, cache,
+                          encoding, min_size)
+    return _serialize(func(*args, **kwargs), stream=stream)
   return wrapped
 
-def _check_csv_schema(schema, row, row_number):
-  csv_row_schema = schema(row_number=row_number)
-  if not csv_row_schema(row):
-    raise CsvValidationError('CSV failed validation', csv_row_schema)
-  return csv_row_schema
-
-def csv_upload(schema, fieldnames=None):
+def csv_upload(schema, fieldnames=None, parallel=None,
+    parallel_threshold=PARALLEL_THRESHOLD, collect_errors=False,
+    max_errors=MAX_REPORTED_ERRORS, batch_size=None, as_columns=False):
   """
   validate each row of a CSV on upload - if a row doesn't pass validation, HTTP
   400 with a body of the validation errors out of the rest schema.
@@ -93,14 +143,61 @@ def csv_upload(schema, fieldnames=None):
   the generator object will be passed to the view function as the rows argument
   and will return a rest.Schema for each row.  if nothing calls the generator,
   no validation will occur
+
+  with `parallel=N`, uploads of at least `parallel_threshold` rows are
+  validated in chunks across a pool of N worker processes, shared by every
+  upload and started as `rest.ingest.START_METHOD` says. the schema must be
+  importable at module level to reach them; others are validated in-process.
+  the workers have no app or request context, so the schema's
+  `validate_<name>` hooks mustn't use `flask.g`, `current_app` or the app's
+  database session. rows still come out in order, and the first invalid row
+  still ends the upload with a 400
+
+  with `parallel` or `batch_size`, rows are checked by
+  `Schema.validate_many`, which doesn't go through the schema's `__call__`,
+  and so are the rows of a `collect_errors` report. a schema overriding
+  `__call__` has it called there only for the invalid row an upload is
+  rejected with. in every mode, it's called with a dict of the row
+
+  with `collect_errors=True`, the whole file is validated before the view is
+  called. if any row fails, HTTP 400 with a report of the errors of the first
+  `max_errors` invalid rows by row number, and a count of them all.
+  otherwise the file is read and validated again for the view's rows
+  generator. that second pass is deliberate: keeping a schema per row from the
+  first would hold the whole upload in memory, where reading it twice keeps it
+  to a chunk of rows at a time
+
+  with `batch_size=N`, the generator yields the coerced values of up to N
+  rows at a time rather than a schema per row, as a list of dicts - or with
+  `as_columns=True`, a dict of lists keyed by field name - ready for a bulk
+  insert. rows are validated a batch at a time, in-process. the valid rows
+  before the first invalid one are still yielded before the upload ends
+  with a 400. `rest.async_csv_upload` takes `batch_size` and `as_columns`
+  to mean the same
   """
+  _check_batch_options(batch_size, as_columns, parallel)
+
   def decorator(view):
     @wraps(view)
     def view_wrapper(*args, **kwargs):
       body = flask.request.files['file'].stream
-      rows = (_check_csv_schema(schema, row, i) \
-          for i, row in enumerate(csv.DictReader(body, fieldnames=fieldnames),
-            start=1))
+      if collect_errors:
+        names, reader = csv_rows(upload_file(body), fieldnames)
+        report = collect_csv_errors(schema, reader, max_errors,
+          workers=parallel, threshold=parallel_threshold, fieldnames=names)
+        if report:
+          return _report_error(report)
+        body.seek(0)
+
+      names, reader = csv_rows(upload_file(body), fieldnames)
+      if batch_size is not None:
+        rows = validate_batches(schema, reader, batch_size, fieldnames=names,
+                                as_columns=as_columns)
+      elif parallel:
+        rows = parallel_rows(schema, reader, parallel,
+                             threshold=parallel_threshold, fieldnames=names)
+      else:
+        rows = validate_rows(schema, reader, fieldnames=names)
       try:
         return view(rows, *args, **kwargs)
       except CsvValidationError as exc:
@@ -109,12 +206,23 @@ def csv_upload(schema, fieldnames=None):
     return view_wrapper
   return decorator
 
-def json_csv_upload(fieldnames):
+def _check_batch_options(batch_size, as_columns, parallel):
+  if batch_size is not None and parallel:
+    raise ValueError('batch_size cannot be used with parallel')
+  if as_columns and batch_size is None:
+    raise ValueError('as_columns needs a batch_size')
+
+def json_csv_upload(fieldnames, stream=False):
   """
   similar to `csv_upload`, but handle bodies like {"csv": "name,a,b\nhonk,c,d"}
   a sequence of fieldnames must be given
   will 400 if there is no "csv" key
 
+  with `stream=True`, the "csv" string is decoded from the request stream a
+  chunk at a time as rows are read, rather than decoding the whole body
+  first. the other keys of the body are passed in `data` - those which come
+  after "csv" are only there once every row has been read. JSON bodies only
+
   doesn't perform validation, instead returns a generator in the "rows" argument
   that yields:
   - a dict (keys as fieldnames, values as CSV row values)
@@ -137,30 +245,46 @@ def json_csv_upload(fieldnames):
 
     return (obj, row_number, errors)
 
-  def csv_reader(byte_string):
-    csv_data   = six.BytesIO(byte_string)
-    csv_reader = csv.reader(csv_data)
-
-    for i, row in enumerate(csv_reader, start=1):
+  def read_rows(f):
+    for i, row in enumerate(csv_reader(f), start=1):
       yield csv_row(row, i)
 
+  def stream_csv(request):
+    data, pieces = stream_member(request.stream, 'csv')
+    first = next(pieces, None) if pieces is not None else None
+    if first is None:
+      return data, None
+    return data, chunked_file(piece.encode('utf8')
+                              for piece in chain([first], pieces))
+
   def decorator(wrapped):
     @wraps(wrapped)
-    @view
+    @view(decode=not stream)
     def view_wrapper(*args, **kwargs):
-      body = kwargs.get('data')
-      if not body or not body.get('csv'):
-        return error({'client': ['"csv" key cannot be empty']})
+      request = flask.request
+      if stream and request.method in ['POST', 'PUT']:
+        try:
+          kwargs['data'], csv_file = stream_csv(request)
+        except JsonStreamError as e:
+          return error({'client': [str(e)]})
+      else:
+        body = kwargs.get('data')
+        csv_file = None
+        if body and body.get('csv'):
+          csv_file = text_file(body.get('csv'))
 
-      csv_data = body.get('csv').encode('utf8')
+      if csv_file is None:
+        return error({'client': ['"csv" key cannot be empty']})
 
       kwargs['rows'] = ((row, line_num, errors) \
-          for row, line_num, errors in csv_reader(csv_data))
+          for row, line_num, errors in read_rows(csv_file))
 
       try:
         return wrapped(*args, **kwargs)
       except CsvValidationError as exc:
         return error(exc.schema)
+      except JsonStreamError as e:
+        return error({'client': [str(e)]})
 
     return view_wrapper
   return decorator
@@ -175,6 +299,18 @@ def error(msg, status=400):
     response.data = codec.encode(msg._errors)
   return response
 
+def _report_error(report, status=400):
+  """
+  `error` for a `CsvErrorReport`, whose rows nest their errors, so as XML
+  it's written by `NestedXmlEncoding` rather than the plain codec
+  """
+  codec = encoder(flask.request, 'errors')
+  if isinstance(codec, XmlEncoding):
+    codec = NestedXmlEncoding(codec.namespace)
+  response = Response(status=status)
+  response.data = codec.encode(report.to_dict())
+  return response
+
 def created(schema):
   response = Response(status=201)
   response.data = _serialize(schema)
@@ -183,7 +319,112 @@ def created(schema):
 def deleted(schema=None):
   return Response(status=204)
 
-def _serialize(item, request=None):
+def _decode(request, codec, limits):
+  """
+  the `data` argument for a view from the body of `request`, raising
+  `LimitExceeded` if it's over `limits`
+  """
+  # check for multipart form data. this will be submitted with the jquery
+  # forms plugin, which makes the request slightly different from
+  # the backbone request.
+  #
+  # right now, since we're only accepting CSV files as upload this way,
+  # we don't need to save the file anywhere, but we'll simply add the files
+  # to the data hash keyed with the name values.
+  if 'CONTENT_TYPE' in request.environ \
+      and ('multipart/form-data' in request.environ['CONTENT_TYPE']
+        or 'application/x-www-form-urlencoded' \
+          in request.environ['CONTENT_TYPE']):
+    if limits is not None:
+      limits.check_length(request)
+    data = request.form.copy()
+    data.update(request.files)
+    return data
+  return codec.decode(request, limits)
+
+def _conditional(func, args, kwargs, codec, stream, etag, cache, encoding,
+    min_size):
+  """
+  answer a GET for a view with an ETag or cache, calling the view only if
+  neither the version nor the cache can
+  """
+  request = flask.request
+  version = etag(*args, **kwargs) if callable(etag) else None
+
+  tag = None
+  if version is not None:
+    tag = _etag('%s:%r' % (type(codec).__name__, version))
+    matched = _matched(tag, encoding)
+    if matched is not None:
+      return _not_modified(matched)
+
+  key = None
+  if cache is not None and not stream:
+    key = (request.path, request.query_string, type(codec).__name__, version)
+    entry = cache.get(key)
+    if entry is not None:
+      return _tagged_response(entry, encoding, min_size)
+
+  body = _serialize(func(*args, **kwargs), stream=stream)
+  if isinstance(body, BaseResponse):
+    if tag is not None and body.status_code == 200:
+      body.set_etag(tag)
+    return body
+
+  body = _bytes(body)
+  if tag is None:
+    tag = _etag(body)
+  # compressed copies of the body are kept alongside it, keyed by encoding
+  entry = (tag, body, {})
+  if key is not None:
+    cache.set(key, entry)
+  return _tagged_response(entry, encoding, min_size)
+
+def _etag(body):
+  return hashlib.sha1(_bytes(body)).hexdigest()
+
+def _matched(tag, encoding):
+  """
+  whichever of `tag` and the tag of the body compressed with `encoding` the
+  request's If-None-Match has, if either
+  """
+  tags = [tag]
+  if encoding is not None:
+    tags.append(compression.encoded_etag(tag, encoding))
+  for t in tags:
+    if flask.request.if_none_match.contains_weak(t):
+      return t
+
+def _tagged_response(entry, encoding, min_size):
+  tag, body, compressed = entry
+  if encoding is None or len(body) < min_size:
+    encoding = None
+  else:
+    tag = compression.encoded_etag(tag, encoding)
+
+  if flask.request.if_none_match.contains_weak(tag):
+    return _not_modified(tag)
+  if encoding is None:
+    response = flask.make_response(body)
+  else:
+    if encoding not in compressed:
+      compressed[encoding] = compression.compress(body, encoding)
+    response = flask.make_response(compressed[encoding])
+    response.headers['Content-Encoding'] = encoding
+  response.set_etag(tag)
+  return response
+
+def _bytes(body):
+  if isinstance(body, bytes):
+    return body
+  return body.encode('utf-8')
+
+def _not_modified(tag):
+  response = Response(status=304)
+  response.set_etag(tag)
+  return response
+
+def _serialize(item, request=None, stream=False):
   if request is None:
     request = flask.request
   codec = encoder(request)
@@ -192,11 +433,29 @@ def _serialize(item, request=None):
     return item
 
   if hasattr(item, '__iter__') and not isinstance(item, dict):
-    return codec.encode([_simplify(i) for i in item])
+    if stream:
+      chunks = codec.iter_encode(item)
+      return Response(flask.stream_with_context(chunks))
+    return codec.dumps([codec.simplify(i) for i in item])
+
+  return codec.dumps(codec.simplify(item))
 
-  return codec.encode(_simplify(item))
 
-def _simplify(item):
-  if hasattr(item, '_get'):
-    return item._get()
-  return item
+def _supports_async():
+  """
+  whether flask can run `async def` views: flask 2 can, which needs python
+  3.6 for them anyway, once its async extra (asgiref) is installed
+  """
+  if not hasattr(flask.Flask, 'ensure_sync'):
+    return False
+  try:
+    import asgiref
+  except ImportError:
+    return False
+  return True
+
+
+# the async variants use the helpers above
+if _supports_async():
+  from .aio import async_csv_upload
+  from .aio import async_view
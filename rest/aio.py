@@ -0,0 +1,239 @@
+"""
+Variants of `rest.view` and `rest.csv_upload` for `async def` views, which
+Flask 2 runs on an event loop once its async extra (asgiref) is installed.
+
+The request body is read and decoded, and lists the view returns are encoded,
+in an executor so big payloads don't hold up the loop. Everything run there
+runs in a copy of the view's context, so the app and request contexts -
+`flask.request`, `current_app`, `g` and the app's config, such as
+MAX_CONTENT_LENGTH - are what they are in the view. Uploaded CSV rows are
+validated by a worker running in the executor for as long as the view reads
+them, which stays a bounded number of rows ahead of it.
+"""
+from __future__ import absolute_import
+import asyncio
+import contextvars
+import threading
+
+from functools import partial
+from functools import wraps
+
+import flask
+
+import rest
+from rest.encoding import encoder
+from rest.ingest import CsvValidationError
+from rest.ingest import MAX_REPORTED_ERRORS
+from rest.ingest import PARALLEL_THRESHOLD
+from rest.ingest import collect_csv_errors
+from rest.ingest import csv_rows
+from rest.ingest import parallel_rows
+from rest.ingest import upload_file
+from rest.ingest import validate_batches
+from rest.ingest import validate_rows
+from rest.limits import LimitExceeded
+
+
+# request bodies smaller than this are decoded on the loop, when they say how
+# big they are
+OFFLOAD_BYTES = 64 * 1024
+
+# rows validated by the worker of an async `rows` iterator before it
+# hands them over, and how many such lists it gets ahead of the view by
+ROW_CHUNK_SIZE = 500
+QUEUE_SIZE = 8
+
+
+def async_view(func=None, stream=False, decode=True, limits=None,
+    executor=None):
+  """
+  `rest.view` for an `async def` view. the body is decoded, and a list the
+  view returns is encoded, in `executor` (the loop's default if None). the
+  `stream`, `decode` and `limits` options are those of `rest.view`
+  """
+  if func is None:
+    return lambda func: async_view(func, stream=stream, decode=decode,
+                                   limits=limits, executor=executor)
+
+  @wraps(func)
+  async def wrapped(*args, **kwargs):
+    request = flask.request._get_current_object()
+    codec   = encoder(request)
+    if decode and request.method in ['POST', 'PUT']:
+      try:
+        kwargs['data'] = await _offload_decode(request, codec, limits,
+                                               executor)
+      except LimitExceeded as e:
+        return rest.error({'client': [str(e)]}, 413)
+      except Exception as e:
+        return rest.error({
+          'client': [str(e)]
+        })
+
+    item = await func(*args, **kwargs)
+    # streamed responses are encoded as the server sends them, off the loop
+    # already
+    if stream or isinstance(item, dict) or not hasattr(item, '__iter__'):
+      return rest._serialize(item, stream=stream)
+    return await run(executor, rest._serialize, item, request)
+  return wrapped
+
+def async_csv_upload(schema, fieldnames=None, parallel=None,
+    parallel_threshold=PARALLEL_THRESHOLD, collect_errors=False,
+    max_errors=MAX_REPORTED_ERRORS, executor=None, batch_size=None,
+    queue_size=QUEUE_SIZE, as_columns=False):
+  """
+  `rest.csv_upload` for an `async def` view. `rows` is an async iterator of
+  schemas to `async for` over, read and validated by a worker in `executor`
+  while the view works through the rows before them. the worker gets no
+  more than `queue_size` chunks of rows ahead of the view
+
+  `batch_size` and `as_columns` mean what they do for `rest.csv_upload`:
+  `rows` yields the coerced values of up to N rows at a time, as a list of
+  dicts or a dict of lists, rather than schemas, and can't be used with
+  `parallel`. the worker gets no more than `queue_size` batches ahead. the
+  other options are those of `rest.csv_upload` too
+  """
+  rest._check_batch_options(batch_size, as_columns, parallel)
+
+  def decorator(view):
+    @wraps(view)
+    async def view_wrapper(*args, **kwargs):
+      request = flask.request._get_current_object()
+      body = await run(executor, _upload_stream, request)
+      if collect_errors:
+        report = await run(executor, _collect_errors, schema, body,
+          fieldnames, max_errors, parallel, parallel_threshold)
+        if report:
+          return rest._report_error(report)
+        body.seek(0)
+
+      names, reader = await run(executor, _read_rows, body, fieldnames)
+      if batch_size is not None:
+        # each batch is already a list, to hand over as it is
+        rows = validate_batches(schema, reader, batch_size, fieldnames=names,
+                                as_columns=as_columns)
+        rows = pipeline(rows, queue_size=queue_size, chunk_size=1,
+                        executor=executor)
+      else:
+        if parallel:
+          rows = parallel_rows(schema, reader, parallel,
+                               threshold=parallel_threshold, fieldnames=names)
+        else:
+          rows = validate_rows(schema, reader, fieldnames=names)
+        rows = pipeline(rows, queue_size=queue_size, executor=executor)
+      try:
+        return await view(rows, *args, **kwargs)
+      except CsvValidationError as exc:
+        return rest.error(exc.schema)
+      finally:
+        # stop the worker now if the view stopped reading early, rather than
+        # whenever the loop gets round to finalizing the generator
+        await rows.aclose()
+
+    return view_wrapper
+  return decorator
+
+async def run(executor, func, *args):
+  """
+  Call `func` with `args` in `executor`, or the loop's default executor if
+  it's None, in a copy of the caller's context.
+  """
+  loop = asyncio.get_event_loop()
+  return await loop.run_in_executor(executor, _in_context(func, *args))
+
+def _in_context(func, *args):
+  """
+  `func` called with `args` in a copy of the current context, wherever it's
+  run - the executor's threads have no app or request context of their own.
+  """
+  return partial(contextvars.copy_context().run, func, *args)
+
+async def pipeline(iterable, batch_size=None, queue_size=QUEUE_SIZE,
+    chunk_size=ROW_CHUNK_SIZE, executor=None):
+  """
+  Iterate asynchronously over a blocking iterable, which a worker run in
+  `executor`, in a copy of the caller's context, pulls from and puts on a
+  queue holding up to `queue_size` lists of items, `batch_size` long if it's
+  given or `chunk_size` otherwise. Once
+  the queue is full, the worker waits for it to be drained, so it's held back
+  by however slowly the items are consumed.
+
+  With `batch_size`, the lists are yielded; otherwise the items are. Items
+  pulled before the iterable raises are still yielded before the exception
+  is. Closing the iterator stops the worker and waits for it to finish.
+  """
+  loop = asyncio.get_event_loop()
+  queue = asyncio.Queue(maxsize=queue_size)
+  stopped = threading.Event()
+  worker = loop.run_in_executor(executor, _in_context(_produce, iterable,
+    batch_size or chunk_size, queue, loop, stopped))
+
+  try:
+    while True:
+      items, exc = await queue.get()
+      if items:
+        if batch_size:
+          yield items
+        else:
+          for item in items:
+            yield item
+      if exc is not None:
+        raise exc
+      if items is None:
+        return
+  finally:
+    stopped.set()
+    # the worker puts at most one more list once it has room, then sees it's
+    # been stopped
+    while not queue.empty():
+      queue.get_nowait()
+    await worker
+
+def _produce(iterable, size, queue, loop, stopped):
+  """
+  Put lists of up to `size` items from `iterable` on `queue`, then
+  `(None, None)` when it's exhausted or `(items, exception)` if it raises.
+  Stops early once `stopped` is set.
+  """
+  items = []
+  try:
+    for item in iterable:
+      items.append(item)
+      if len(items) >= size:
+        if not _put(queue, loop, stopped, (items, None)):
+          return
+        items = []
+  except Exception as e:
+    _put(queue, loop, stopped, (items, e))
+    return
+  if not items or _put(queue, loop, stopped, (items, None)):
+    _put(queue, loop, stopped, (None, None))
+
+def _put(queue, loop, stopped, message):
+  """
+  Put `message` on `queue` from a thread other than the loop's, returning
+  False if the consumer has stopped.
+  """
+  if stopped.is_set():
+    return False
+  asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+  return not stopped.is_set()
+
+async def _offload_decode(request, codec, limits, executor):
+  length = request.content_length
+  if length is not None and length < OFFLOAD_BYTES:
+    return rest._decode(request, codec, limits)
+  return await run(executor, rest._decode, request, codec, limits)
+
+def _upload_stream(request):
+  return request.files['file'].stream
+
+def _read_rows(body, fieldnames):
+  return csv_rows(upload_file(body), fieldnames)
+
+def _collect_errors(schema, body, fieldnames, max_errors, parallel,
+    parallel_threshold):
+  names, reader = _read_rows(body, fieldnames)
+  return collect_csv_errors(schema, reader, max_errors, workers=parallel,
+    threshold=parallel_threshold, fieldnames=names)
@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+  """
+  A bounded mapping which evicts the least recently used entry once it holds
+  more than `maxsize` of them. It may be shared between threads.
+  """
+  def __init__(self, maxsize=128):
+    self.maxsize = maxsize
+    self._data = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._data)
+
+  def __contains__(self, key):
+    return key in self._data
+
+  def get(self, key, default=None):
+    with self._lock:
+      try:
+        value = self._data.pop(key)
+      except KeyError:
+        return default
+      self._data[key] = value
+      return value
+
+  def set(self, key, value):
+    with self._lock:
+      self._data.pop(key, None)
+      self._data[key] = value
+      if len(self._data) > self.maxsize:
+        self._data.popitem(last=False)
+
+  def discard(self, key):
+    with self._lock:
+      self._data.pop(key, None)
+
+  def clear(self):
+    with self._lock:
+      self._data.clear()
+
+
+class ResponseCache(LRUCache):
+  """
+  An `LRUCache` whose entries also expire `ttl` seconds after they're set, or
+  never if it's None. It's what `rest.view` stores encoded responses in; any
+  object with the same `get` and `set` can be used instead.
+  """
+  def __init__(self, maxsize=1024, ttl=60, clock=time.time):
+    super(ResponseCache, self).__init__(maxsize)
+    self.ttl = ttl
+    self._clock = clock
+
+  def get(self, key, default=None):
+    entry = super(ResponseCache, self).get(key)
+    if entry is None:
+      return default
+
+    expires, value = entry
+    if expires is not None and expires <= self._clock():
+      self.discard(key)
+      return default
+    return value
+
+  def set(self, key, value):
+    expires = None
+    if self.ttl is not None:
+      expires = self._clock() + self.ttl
+    super(ResponseCache, self).set(key, (expires, value))
@@ -0,0 +1,133 @@
+"""
+Compression of response bodies with gzip, deflate or, when the brotli package
+is installed, brotli, negotiated from the request's Accept-Encoding.
+"""
+from __future__ import absolute_import
+import zlib
+
+import six
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+
+# bodies smaller than this are sent as they are
+MIN_SIZE = 1024
+
+# zlib's wbits for each encoding; 16 + MAX_WBITS writes a gzip wrapper
+_WBITS = {
+  'gzip':     16 + zlib.MAX_WBITS,
+  'deflate':  zlib.MAX_WBITS,
+}
+
+LEVEL = 6
+
+
+def encodings():
+  """
+  The encodings which can be used, most preferred first.
+  """
+  if brotli is not None:
+    return ('br', 'gzip', 'deflate')
+  return ('gzip', 'deflate')
+
+def negotiate(request):
+  """
+  The encoding to compress the response to `request` with, or None.
+  """
+  return request.accept_encodings.best_match(encodings())
+
+def compressor(encoding):
+  """
+  A compressor for `encoding`, with `compress(data)`, `sync()` to flush what
+  has been compressed so far, and `finish()`.
+  """
+  if encoding == 'br':
+    return _BrotliCompressor()
+  return _ZlibCompressor(encoding)
+
+def compress(data, encoding):
+  c = compressor(encoding)
+  return c.compress(_bytes(data)) + c.finish()
+
+def iter_compress(chunks, encoding):
+  """
+  Compress an iterable of chunks as they're consumed. Each chunk is flushed
+  so that it reaches the client without waiting for the next one.
+  """
+  c = compressor(encoding)
+  for chunk in chunks:
+    data = c.compress(_bytes(chunk)) + c.sync()
+    if data:
+      yield data
+  yield c.finish()
+
+def compress_response(response, encoding, min_size=MIN_SIZE):
+  """
+  Compress `response` in place with `encoding`, streaming it if it's
+  streamed. Responses with no body or already encoded are left alone, as are
+  ones smaller than `min_size`.
+  """
+  response.vary.add('Accept-Encoding')
+  if encoding is None or response.status_code in (204, 304) \
+      or 'Content-Encoding' in response.headers:
+    return response
+
+  if response.is_streamed:
+    response.response = iter_compress(response.response, encoding)
+    response.headers.pop('Content-Length', None)
+  else:
+    data = response.get_data()
+    if len(data) < min_size:
+      return response
+    response.set_data(compress(data, encoding))
+
+  response.headers['Content-Encoding'] = encoding
+  tag, weak = response.get_etag()
+  if tag:
+    response.set_etag(encoded_etag(tag, encoding), weak)
+  return response
+
+def encoded_etag(tag, encoding):
+  """
+  The ETag of the `encoding` compressed body of a response tagged `tag`.
+  """
+  return '%s-%s' % (tag, encoding)
+
+
+class _ZlibCompressor(object):
+
+  def __init__(self, encoding):
+    self._compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, _WBITS[encoding])
+
+  def compress(self, data):
+    return self._compressor.compress(data)
+
+  def sync(self):
+    return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+  def finish(self):
+    return self._compressor.flush()
+
+
+class _BrotliCompressor(object):
+
+  def __init__(self):
+    self._compressor = brotli.Compressor()
+
+  def compress(self, data):
+    return self._compressor.process(data)
+
+  def sync(self):
+    return self._compressor.flush()
+
+  def finish(self):
+    return self._compressor.finish()
+
+
+def _bytes(data):
+  if isinstance(data, six.text_type):
+    return data.encode('utf-8')
+  return data
@@ -1,42 +1,95 @@
 from __future__ import absolute_import
 import sys
-import json
 
 from collections import defaultdict
-from decimal import Decimal
 from xml.etree import ElementTree
+import flask
 import six
 from six.moves import map
 
+from rest import json_backend
+from rest import xml_decode
+from rest.cache import LRUCache
 
-# This class is for backwards compatability with Python 2.6
-# and can be removed whenever that is no longer necessary.
-class DecimalEncoder(json.JSONEncoder):
-  def default(self, obj):
-    if isinstance(obj, Decimal):
-      return float(obj)
-    return json.JSONEncoder.default(self, obj)
+
+# encoded output is buffered up to this many characters before a streamed
+# response yields it
+STREAM_CHUNK_SIZE = 16384
+
+XML_DECLARATION = b"<?xml version='1.0' encoding='UTF-8'?>\n"
+
+
+# The stdlib encoder used to live here; the name is kept for anything that
+# still imports it.
+DecimalEncoder = json_backend.DefaultEncoder
 
 
 class JsonEncoding(object):
+  backend = json_backend.backend
+
   def __init__(self, namespace):
     pass
 
-  def decode(self, request):
-    if request.data:
-      return json.loads(request.get_data(as_text=True))
+  def decode(self, request, limits=None):
+    """
+    Decode the body of `request`, held to `limits` if they're given.
+    """
+    if limits is not None:
+      body = limits.read_json(request).decode('utf-8')
+    else:
+      body = request.get_data(as_text=True)
+
+    if body:
+      return self.backend.loads(body)
     else:
       return {}
 
+  def simplify(self, item):
+    """
+    The representation of `item` to encode. Schemas are asked for theirs
+    without a namespace; a plain dict has its namespace dropped without being
+    modified.
+    """
+    if hasattr(item, '_get'):
+      return item._get(namespace=False)
+    return self._clean_namespace(item)
+
   def encode(self, dct):
-    cleaned = self._clean_namespace(dct)
-    return json.dumps(cleaned, cls=DecimalEncoder)
+    return self.dumps(self._clean_namespace(dct))
+
+  def dumps(self, simplified):
+    """
+    Encode a value which has already been through `simplify`.
+    """
+    return self.backend.dumps(simplified)
+
+  def iter_encode(self, items):
+    """
+    Encode an iterable as a JSON list, yielding the output in chunks as the
+    items are consumed.
+    """
+    buf = ['[']
+    size = 1
+    separator = ''
+    for item in items:
+      encoded = self.dumps(self.simplify(item))
+      buf.append(separator)
+      buf.append(encoded)
+      separator = self.backend.separator
+      size += len(encoded) + len(separator)
+      if size >= STREAM_CHUNK_SIZE:
+        yield ''.join(buf)
+        buf = []
+        size = 0
+    buf.append(']')
+    yield ''.join(buf)
 
   def _clean_namespace(self, el):
     if isinstance(el, list):
       return [self._clean_namespace(e) for e in el]
     elif isinstance(el, dict) and '__namespace__' in el:
-      el.pop('__namespace__')
+      return dict((k, v) for k, v in six.iteritems(el)
+                  if k != '__namespace__')
     return el
 
 
@@ -44,9 +97,29 @@ class XmlEncoding(object):
   def __init__(self, namespace):
     self.namespace = namespace
 
-  def decode(self, request):
+  def decode(self, request, limits=None):
+    """
+    Decode the body of `request`, held to `limits` if they're given.
+    """
+    if limits is not None:
+      return self._decode_dict(xml_decode.parse(limits.chunks(request),
+        limits.max_xml_depth, limits.max_xml_elements))
     return self._decode_str(request.data)
 
+  def simplify(self, item):
+    """
+    The representation of `item` to encode, namespace included.
+    """
+    if hasattr(item, '_get'):
+      return item._get()
+    return item
+
+  def dumps(self, simplified):
+    """
+    Encode a value which has already been through `simplify`.
+    """
+    return self.encode(simplified)
+
   def encode(self, dct):
     if isinstance(dct, dict):
       root = self.encode_dict(dct)
@@ -55,11 +128,36 @@ class XmlEncoding(object):
     else:
       root = self.encode_dict(dct)
     if sys.version_info[0] >= 3:
-      return b"<?xml version='1.0' encoding='UTF-8'?>\n" + \
-          ElementTree.tostring(root, encoding='UTF-8')
+      return XML_DECLARATION + ElementTree.tostring(root, encoding='UTF-8')
     else:
       return ElementTree.tostring(root, encoding='UTF-8')
 
+  def iter_encode(self, items):
+    """
+    Encode an iterable as an `items` document, serializing each item's element
+    on its own and yielding the output in chunks as the items are consumed.
+    """
+    buf = [XML_DECLARATION]
+    size = len(XML_DECLARATION)
+    empty = True
+    for item in items:
+      if empty:
+        buf.append(b'<items>')
+        empty = False
+      element = self.dict_to_element_tree(self.simplify(item))
+      # ElementTree leaves the declaration out for utf-8, but python 2's only
+      # when it's spelled in lower case, which keeps one from being written
+      # per item there
+      encoded = ElementTree.tostring(element, encoding='utf-8')
+      buf.append(encoded)
+      size += len(encoded)
+      if size >= STREAM_CHUNK_SIZE:
+        yield b''.join(buf)
+        buf = []
+        size = 0
+    buf.append(b'<items />' if empty else b'</items>')
+    yield b''.join(buf)
+
   def encode_dict(self, dct):
     return self.dict_to_element_tree(dct)
 
@@ -78,12 +176,11 @@ class XmlEncoding(object):
     return str(v)
 
   def dict_to_element_tree(self, dct):
-    if '__namespace__' in dct:
-      namespace = dct.pop('__namespace__')
-    else:
-      namespace = self.namespace
+    namespace = dct.get('__namespace__', self.namespace)
     root = ElementTree.Element(namespace)
     for k, vs in dct.items():
+      if k == '__namespace__':
+        continue
       if not hasattr(vs, '__iter__') or isinstance(vs, str):
         vs = [vs]
 
@@ -95,9 +192,11 @@ class XmlEncoding(object):
     return root
 
   def _decode_str(self, string):
-    e = ElementTree.XML(string)
+    return self._decode_dict(xml_decode.loads(string))
+
+  def _decode_dict(self, tree):
     d = dict()
-    for values in self.etree_to_dict(e).values():
+    for values in tree.values():
       d.update(values)
     return d
 
@@ -126,7 +225,69 @@ class XmlEncoding(object):
     return d
 
 
+class NestedXmlEncoding(XmlEncoding):
+  """
+  `XmlEncoding` for bodies shaped for it, such as a `CsvErrorReport`: a dict
+  value nests an element of its own, and only bools are written as `true`
+  and `false`, not the numbers 1 and 0 too. Other bodies keep the plain
+  codec, so what existing clients get doesn't change.
+  """
+  def value_to_string(self, v):
+    if v is True:
+      return 'true'
+    if v is False:
+      return 'false'
+
+    return str(v)
+
+  def dict_to_element_tree(self, dct, tag=None):
+    namespace = tag or dct.get('__namespace__', self.namespace)
+    root = ElementTree.Element(namespace)
+    for k, vs in dct.items():
+      if k == '__namespace__':
+        continue
+      if isinstance(vs, dict) or not hasattr(vs, '__iter__') \
+          or isinstance(vs, str):
+        vs = [vs]
+
+      for v in vs:
+        if isinstance(v, dict):
+          root.append(self.dict_to_element_tree(v, k))
+          continue
+        element = ElementTree.Element(k)
+        if v is not None:
+          element.text = self.value_to_string(v)
+        root.append(element)
+    return root
+
+
+# codecs hold no per-request state, so one instance is shared by every request
+# with the same Accept header and namespace
+_codecs = LRUCache(maxsize=256)
+
 def encoder(request, namespace='body'):
+  accept = request.environ.get('HTTP_ACCEPT', '')
+  key = (accept, namespace)
+
+  # `g` can outlive a single request when an app context is pushed around
+  # several (as in tests), so it is keyed on the Accept header too
+  negotiated = None
+  if flask.has_request_context():
+    negotiated = flask.g.setdefault('_rest_codecs', {})
+    codec = negotiated.get(key)
+    if codec is not None:
+      return codec
+
+  codec = _codecs.get(key)
+  if codec is None:
+    codec = _negotiate(request, namespace)
+    _codecs.set(key, codec)
+
+  if negotiated is not None:
+    negotiated[key] = codec
+  return codec
+
+def _negotiate(request, namespace):
   best = request.accept_mimetypes.best_match([
     'application/json',
     'text/xml'
@@ -3,12 +3,75 @@ from datetime import datetime
 from decimal import Decimal
 from locale import atof
 from locale import atoi
+from locale import localeconv
 
 from rest.validators import email
+from rest.validators import fuse
 from rest.validators import url
 import six
 
 
+# marks a field whose simplified value hasn't been computed since it changed
+_UNSET = object()
+
+
+def _clone(obj):
+  clone = obj.__class__.__new__(obj.__class__)
+  clone.__dict__.update(obj.__dict__)
+  return clone
+
+
+def _coerce_column(coerce, values, fast=None):
+  """
+  Coerce every value in `values`, trying the cheap `fast` conversion first and
+  falling back to the field's own `coerce` for anything it rejects. Returns
+  the coerced values and a dict of errors keyed by position; positions that
+  failed hold None.
+  """
+  coerced = []
+  errors = {}
+  append = coerced.append
+
+  for i, value in enumerate(values):
+    if fast is not None:
+      try:
+        append(fast(value))
+        continue
+      except Exception:
+        pass
+
+    try:
+      append(coerce(value))
+    except ValueError as v:
+      append(None)
+      errors[i] = list(v.args)
+    except:
+      append(None)
+      errors[i] = ['Invalid data']
+  return coerced, errors
+
+
+def _number_parser(parse, empty):
+  """
+  A locale-aware number parser which skips `locale.atoi`/`atof` (and the
+  `localeconv` lookup they make per call) for strings the builtin `parse`
+  already reads the same way. Returns None when that can't be done under the
+  current locale.
+  """
+  conv = localeconv()
+  if conv['decimal_point'] != '.':
+    return None
+  separator = conv['thousands_sep']
+
+  def fast(value):
+    if value == '':
+      return empty
+    if separator and separator in value:
+      raise ValueError(value)
+    return parse(value)
+  return fast
+
+
 class Field(object):
   """
   A field is a pointer to a value. It may coerce and validate values. The values
@@ -16,25 +79,44 @@ class Field(object):
   This distincation is made reflectivly by checking for `get` and `set` methods
   on the passed value.
   """
+  # the cached result of `get_simplified`, and the cell holding the cached
+  # representation of the schema the field is bound to, dropped on any change
+  _simplified = _UNSET
+  _cell = None
+
   def __init__(self, value=None, validators=[], default=None):
     self.serialize = True
     self._validators = validators
+    self._check = fuse(validators)
     self._value = value
     self._default = default
 
     self._has_get = hasattr(value, 'get')
     self._has_set = hasattr(value, 'set')
     self._has_reset = hasattr(value, 'reset')
+    self._has_bind = hasattr(value, 'bind')
+
+  def __get__(self, instance, owner):
+    if instance is None:
+      return self
+    return instance._values[owner._slot_of[self]]
+
+  def bind(self, memo):
+    """
+    Return a copy of this field holding its own value, for use by a single
+    `Schema` instance. The field declared on the class is never written to, so
+    one schema class may be used from many threads at once. Fields pointing at
+    other fields or models bind those too, sharing copies through `memo`.
+    """
+    bound = memo.get(id(self))
+    if bound is None:
+      bound = memo[id(self)] = _clone(self)
+      if self._has_bind:
+        bound._value = self._value.bind(memo)
+    return bound
 
   def validate(self):
-    value = self.get()
-    errors = []
-
-    for validator in self._validators:
-      error = validator(value)
-      if error:
-        errors += error
-    return errors
+    return self._check(self.get())
 
   def default(self):
     value = self.get()
@@ -51,7 +133,18 @@ class Field(object):
       return self._value
 
   def get_simplified(self):
-    return self.simplify(self.get())
+    """
+    The simplified value, cached until the field is next set or reset. Fields
+    pointing at another field or a model can't see when its value changes, so
+    they simplify it every time.
+    """
+    if self._has_get:
+      return self.simplify(self.get())
+
+    simplified = self._simplified
+    if simplified is _UNSET:
+      simplified = self._simplified = self.simplify(self.get())
+    return simplified
 
   def set(self, value):
     if value is None:
@@ -60,23 +153,40 @@ class Field(object):
 
   def _set(self, value):
     try:
-      coerced = self.coerce(value)
-      if self._has_set:
-        self._value.set(coerced)
-      else:
-        self._value = coerced
+      self._store(self.coerce(value))
     except ValueError as v:
       return v.args
     except:
       return ['Invalid data']
 
+  def _store(self, coerced):
+    if self._has_set:
+      self._value.set(coerced)
+    else:
+      self._value = coerced
+    self._simplified = _UNSET
+    if self._cell is not None:
+      self._cell[0] = None
+
   def coerce(self, value):
     return value
 
+  def coerce_column(self, values):
+    """
+    Coerce a whole column of raw values at once. Returns a list of coerced
+    values and a sparse dict mapping the position of each value that could not
+    be coerced to its errors.
+    """
+    return _coerce_column(self.coerce, values)
+
   def simplify(self, value):
     return value
 
   def reset(self):
+    self._simplified = _UNSET
+    if self._cell is not None:
+      self._cell[0] = None
+
     if self._has_reset:
       return self._value.reset()
 
@@ -151,6 +261,8 @@ class Bool(Field):
 
 
 class StringBool(Field):
+  _choices = {'true': True, 'false': False}
+
   def coerce(self, value):
     str_value = str(value).lower()
     if str_value == 'true':
@@ -160,6 +272,11 @@ class StringBool(Field):
 
     raise ValueError("Value must be 'true' or 'false'")
 
+  def coerce_column(self, values):
+    lookup = self._choices
+    return _coerce_column(self.coerce, values,
+      lambda value: lookup[value.lower()])
+
 
 class Int(Field):
   def coerce(self, value):
@@ -173,6 +290,9 @@ class Int(Field):
     except:
       raise ValueError("Invalid integer")
 
+  def coerce_column(self, values):
+    return _coerce_column(self.coerce, values, _number_parser(int, 0))
+
 
 class NoneInt(Field):
   def coerce(self, value):
@@ -202,6 +322,9 @@ class Float(Field):
     except:
       raise ValueError("Invalid float")
 
+  def coerce_column(self, values):
+    return _coerce_column(self.coerce, values, _number_parser(float, 0.0))
+
   def get(self):
     val = super(Float, self).get()
     if val is not None: return float(val)
@@ -216,6 +339,13 @@ class Dollars(Field):
     except:
       raise ValueError("Invalid decimal")
 
+  def coerce_column(self, values):
+    def fast(value):
+      if not isinstance(value, six.string_types):
+        raise TypeError(value)
+      return Decimal(value or '0')
+    return _coerce_column(self.coerce, values, fast)
+
   def simplify(self, value):
     return str(value.quantize(Decimal('0.01')))
 
@@ -0,0 +1,478 @@
+"""
+Reading of uploaded CSV data, and validation of its rows against a schema,
+one row at a time in the request's own process or a chunk at a time across a
+process pool.
+
+The pools are shared by every request in the process, one per number of
+workers asked for, started the first time they're needed and kept for the
+life of the process. Their workers are started by `START_METHOD` rather than
+forked from the server, which may have request threads running, so schema
+classes reach them by reference and must be importable at module level;
+uploads for any other schema are validated in-process.
+"""
+from __future__ import absolute_import
+import csv
+import io
+import mmap
+import multiprocessing
+import os
+import pickle
+import tempfile
+import threading
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
+from itertools import islice
+
+import six
+import unicodecsv
+from six.moves import zip_longest
+
+from rest.schema import Schema
+
+
+_schema_call = six.get_unbound_function(Schema.__call__)
+
+# uploads with fewer rows than this are validated in-process even when a pool
+# was asked for, since starting one costs more than it saves
+PARALLEL_THRESHOLD = 10000
+
+# rows handed to a pool worker at a time
+PARALLEL_CHUNK_SIZE = 2000
+
+# how pool workers are started: a fork server where there is one, which forks
+# them from a clean process of its own, or a fresh interpreter otherwise
+if 'forkserver' in multiprocessing.get_all_start_methods():
+  START_METHOD = 'forkserver'
+else:
+  START_METHOD = 'spawn'
+
+# invalid rows whose errors are reported when a whole upload is validated
+MAX_REPORTED_ERRORS = 100
+
+
+# uploads bigger than this are read from a temporary file through a memory map
+# rather than from memory
+SPOOL_THRESHOLD = 8 * 1024 * 1024
+
+# bytes copied or encoded at a time while spooling
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+
+class CsvValidationError(ValueError):
+
+  def __init__(self, message, schema):
+    self.schema = schema
+    super(CsvValidationError, self).__init__(message)
+
+
+def upload_file(stream, threshold=SPOOL_THRESHOLD):
+  """
+  A binary file of an upload's contents from its current position, which may
+  be closed without closing `stream`. Uploads which are already on disk are
+  read through a memory map, and those still in memory are copied. Anything
+  else is spooled to a temporary file once it passes `threshold` bytes.
+  """
+  if _in_memory(stream):
+    return six.BytesIO(stream.read())
+  if _fileno(stream) is not None:
+    return _mapped_file(stream)
+  return _spooled_file(iter(lambda: stream.read(SPOOL_CHUNK_SIZE), b''),
+                       threshold)
+
+def text_file(text, threshold=SPOOL_THRESHOLD):
+  """
+  A binary file of `text` encoded as UTF-8. Text longer than `threshold` is
+  encoded a piece at a time into a temporary file instead of into one more
+  copy in memory.
+  """
+  if len(text) <= threshold:
+    return six.BytesIO(text.encode('utf8'))
+  return _spooled_file((text[i:i + SPOOL_CHUNK_SIZE].encode('utf8')
+    for i in range(0, len(text), SPOOL_CHUNK_SIZE)), threshold)
+
+def chunked_file(chunks):
+  """
+  A binary file which reads from an iterable of chunks of bytes as they're
+  needed.
+  """
+  return io.BufferedReader(_ChunkedFile(chunks), SPOOL_CHUNK_SIZE)
+
+def csv_reader(f, encoding='utf-8'):
+  """
+  The rows of the CSV in binary file `f`, as lists of text. On Python 3 this
+  is the stdlib reader over a `TextIOWrapper`, which decodes in bulk; on
+  Python 2, unicodecsv.
+  """
+  if six.PY3:
+    return csv.reader(io.TextIOWrapper(f, encoding=encoding, newline=''))
+  return unicodecsv.reader(f, encoding=encoding)
+
+def csv_rows(f, fieldnames=None):
+  """
+  Returns `(fieldnames, rows)` for the CSV in binary file `f`, where rows
+  are lists of values in the order of `fieldnames`, to be matched to fields by
+  position rather than through a dict per row. Fieldnames are read from the
+  header when not given. Blank lines are skipped, as `csv.DictReader` does.
+  """
+  reader = csv_reader(f)
+  if fieldnames is None:
+    fieldnames = next(reader, [])
+  return tuple(fieldnames), (row for row in reader if row)
+
+def check_csv_schema(schema, row, row_number, fieldnames=None):
+  csv_row_schema = schema(row_number=row_number)
+  if not csv_row_schema(_row_data(schema, row, fieldnames)):
+    raise CsvValidationError('CSV failed validation', csv_row_schema)
+  return csv_row_schema
+
+def validate_rows(schema, rows, fieldnames=None):
+  """
+  Yield a validated `schema` for each row, numbered from 1, raising
+  `CsvValidationError` at the first row which fails. Rows are dicts, or
+  sequences of values in the order of `fieldnames` when it is given.
+  """
+  for i, row in enumerate(rows, start=1):
+    yield check_csv_schema(schema, row, i, fieldnames)
+
+def validate_batches(schema, rows, size, fieldnames=None, as_columns=False):
+  """
+  Validate rows with `schema.validate_many` `size` at a time, yielding the
+  coerced values of each batch as a list of dicts keyed by field name, or with
+  `as_columns` a dict of lists. At the first row which fails, what's valid of
+  its batch before it is yielded and then `CsvValidationError` raised, as
+  `validate_rows` would.
+  """
+  rows = iter(rows)
+  start = 1
+  chunk = list(islice(rows, size))
+  while chunk:
+    result = schema.validate_many(chunk, start, fieldnames)
+    columns = result.columns
+    failed = min(result.errors) if result.errors else None
+    if failed is not None:
+      # every row before the first failure passed
+      columns = dict((name, column[:failed - start])
+                     for name, column in six.iteritems(columns))
+
+    if failed != start:
+      if as_columns:
+        yield columns
+      else:
+        names = list(columns)
+        yield [dict(zip(names, values))
+               for values in zip(*[columns[name] for name in names])]
+
+    if failed is not None:
+      # fail as `validate_rows` would. should the row pass one at a time, its
+      # errors from the batch are kept rather than passing it over
+      row_schema = schema(row_number=failed)
+      if row_schema(_row_data(schema, chunk[failed - start], fieldnames)):
+        row_schema._errors = result.errors[failed]
+      raise CsvValidationError('CSV failed validation', row_schema)
+    start += len(chunk)
+    chunk = list(islice(rows, size))
+
+def parallel_rows(schema, rows, workers, threshold=PARALLEL_THRESHOLD,
+    chunk_size=PARALLEL_CHUNK_SIZE, fieldnames=None):
+  """
+  Behaves like `validate_rows`, but validates chunks of rows with
+  `Schema.validate_many` in a pool of `workers` processes. Schemas are still
+  yielded in row order, and every row before the first failing one is yielded
+  before `CsvValidationError` is raised for it.
+
+  Falls back to `validate_rows` for fewer than `threshold` rows, or when the
+  schema can't be handed to another process.
+  """
+  rows = iter(rows)
+  head = list(islice(rows, threshold))
+  if len(head) < threshold or not _poolable(schema):
+    for schema_row in validate_rows(schema, chain(head, rows), fieldnames):
+      yield schema_row
+    return
+
+  results = _pooled_results(schema, chain(head, rows), workers, chunk_size,
+                            fieldnames)
+  try:
+    for start, chunk, result in results:
+      for schema_row in _merge(schema, start, chunk, result, fieldnames):
+        yield schema_row
+  finally:
+    results.close()
+
+def collect_csv_errors(schema, rows, max_errors=MAX_REPORTED_ERRORS,
+    workers=None, threshold=PARALLEL_THRESHOLD,
+    chunk_size=PARALLEL_CHUNK_SIZE, fieldnames=None):
+  """
+  Validate every row, numbered from 1, and return a `CsvErrorReport` of the
+  rows which failed. Chunks of rows go through `Schema.validate_many`, in a
+  pool of `workers` processes for at least `threshold` rows if `workers` is
+  given. Nothing is kept of the valid rows, so an upload of any size is
+  checked in the memory of a chunk.
+  """
+  report = CsvErrorReport(max_errors)
+  rows = iter(rows)
+
+  pooled = False
+  if workers:
+    head = list(islice(rows, threshold))
+    pooled = len(head) >= threshold and _poolable(schema)
+    rows = chain(head, rows)
+
+  if pooled:
+    results = _pooled_results(schema, rows, workers, chunk_size, fieldnames)
+  else:
+    results = ((start, chunk, schema.validate_many(chunk, start, fieldnames))
+      for start, chunk in _chunks(rows, chunk_size))
+
+  try:
+    for start, chunk, result in results:
+      for row_number in sorted(result.errors):
+        report.add(row_number, result.errors[row_number])
+  finally:
+    results.close()
+  return report
+
+
+class CsvErrorReport(object):
+  """
+  The errors of an upload validated in full. The field errors of the first
+  `max_errors` invalid rows are kept, keyed by row number, along with a count
+  of every invalid row.
+  """
+  def __init__(self, max_errors=MAX_REPORTED_ERRORS):
+    self.max_errors = max_errors
+    self.rows = {}
+    self.error_count = 0
+
+  def __bool__(self):
+    return self.error_count > 0
+  __nonzero__ = __bool__
+
+  def add(self, row_number, errors):
+    self.error_count += 1
+    if len(self.rows) < self.max_errors:
+      self.rows[row_number] = errors
+
+  def to_dict(self):
+    """
+    The report as a response body. Rows are listed in order, each with its
+    number under "row", rather than keyed by number, so it can be written as
+    XML by `rest.encoding.NestedXmlEncoding` as well as JSON.
+    """
+    return {
+      'rows':         [{'row': row_number, 'errors': self.rows[row_number]}
+                       for row_number in sorted(self.rows)],
+      'error_count':  self.error_count,
+      'truncated':    self.error_count > len(self.rows),
+    }
+
+
+def _row_data(schema, row, fieldnames):
+  """
+  What to call a `schema` instance with for `row`. A positional row is paired
+  with `fieldnames`, which `Schema.__call__` takes as they are, but a schema
+  overriding it is given a dict, as `csv.DictReader` rows always were.
+  """
+  if fieldnames is None:
+    return row
+  pairs = zip_longest(fieldnames, row)
+  if six.get_unbound_function(schema.__call__) is not _schema_call:
+    return dict(pairs)
+  return pairs
+
+def _in_memory(stream):
+  """
+  Whether `stream` is held in memory, so has no file to map.
+  """
+  if isinstance(stream, io.BytesIO):
+    return True
+  # werkzeug's default stream factory spools uploads to a
+  # tempfile.SpooledTemporaryFile, which only sets the private `_rolled` once
+  # it has moved to disk. asking one still in memory for its fileno would
+  # roll it over, so it's checked first
+  if isinstance(stream, tempfile.SpooledTemporaryFile):
+    return not getattr(stream, '_rolled', True)
+  return False
+
+def _fileno(stream):
+  try:
+    return stream.fileno()
+  except (AttributeError, IOError, ValueError):
+    return None
+
+class _MappedFile(io.RawIOBase):
+  """
+  A read-only raw file over a memory map of `fileobj`, from its position when
+  mapped. Closing it closes `owned` too, if given.
+  """
+  def __init__(self, fileobj, owned=None):
+    super(_MappedFile, self).__init__()
+    self._owned = owned
+    self._mapped = None
+
+    fileobj.flush()
+    position = fileobj.tell()
+    if os.fstat(fileobj.fileno()).st_size > position:
+      self._mapped = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+      self._mapped.seek(position)
+
+  def readable(self):
+    return True
+
+  def readinto(self, b):
+    if self._mapped is None:
+      return 0
+    data = self._mapped.read(len(b))
+    b[:len(data)] = data
+    return len(data)
+
+  def close(self):
+    if not self.closed:
+      if self._mapped is not None:
+        self._mapped.close()
+      if self._owned is not None:
+        self._owned.close()
+    super(_MappedFile, self).close()
+
+class _ChunkedFile(io.RawIOBase):
+
+  def __init__(self, chunks):
+    super(_ChunkedFile, self).__init__()
+    self._chunks = iter(chunks)
+    self._pending = b''
+
+  def readable(self):
+    return True
+
+  def readinto(self, b):
+    while not self._pending:
+      self._pending = next(self._chunks, None)
+      if self._pending is None:
+        self._pending = b''
+        return 0
+    n = min(len(b), len(self._pending))
+    b[:n] = self._pending[:n]
+    self._pending = self._pending[n:]
+    return n
+
+def _mapped_file(fileobj, owned=None):
+  return io.BufferedReader(_MappedFile(fileobj, owned), SPOOL_CHUNK_SIZE)
+
+def _spooled_file(chunks, threshold):
+  """
+  Buffer `chunks` of bytes in memory until they pass `threshold` bytes, then
+  in a temporary file, and return a binary file of the result.
+  """
+  buffered = six.BytesIO()
+  size = 0
+  spool = None
+  for chunk in chunks:
+    size += len(chunk)
+    if spool is None and size > threshold:
+      spool = tempfile.TemporaryFile()
+      spool.write(buffered.getvalue())
+      buffered = None
+
+    if spool is None:
+      buffered.write(chunk)
+    else:
+      spool.write(chunk)
+
+  if spool is None:
+    buffered.seek(0)
+    return buffered
+  spool.seek(0)
+  return _mapped_file(spool, owned=spool)
+
+def _poolable(schema):
+  """
+  Whether `schema` can be sent to a pool worker, which it is by reference.
+  """
+  try:
+    pickle.dumps(schema)
+  except Exception:
+    return False
+  return True
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool(workers):
+  """
+  The shared pool of `workers` processes, started if there isn't one yet.
+  """
+  with _pools_lock:
+    pool = _pools.get(workers)
+    if pool is None:
+      pool = ProcessPoolExecutor(max_workers=workers,
+        mp_context=multiprocessing.get_context(START_METHOD))
+      _pools[workers] = pool
+    return pool
+
+def _discard_pool(workers, pool):
+  """
+  Drop `pool`, which a worker died in, so the next upload starts another.
+  """
+  with _pools_lock:
+    if _pools.get(workers) is pool:
+      del _pools[workers]
+  pool.shutdown(wait=False)
+
+def _pooled_results(schema, rows, workers, chunk_size, fieldnames):
+  """
+  Validate chunks of `rows` in the shared pool of `workers` processes,
+  yielding `(start, chunk, BatchResult)` in row order. No more than one chunk
+  per worker is queued ahead of the consumer.
+  """
+  pool = _pool(workers)
+  pending = deque()
+  try:
+    for start, chunk in _chunks(rows, chunk_size):
+      pending.append((start, chunk, pool.submit(_validate_chunk, schema,
+                                                chunk, start, fieldnames)))
+      if len(pending) > workers:
+        start, chunk, future = pending.popleft()
+        yield start, chunk, future.result()
+
+    while pending:
+      start, chunk, future = pending.popleft()
+      yield start, chunk, future.result()
+  except BrokenProcessPool:
+    _discard_pool(workers, pool)
+    raise
+  finally:
+    # the pool carries on serving other requests
+    for _, _, future in pending:
+      future.cancel()
+
+def _chunks(rows, size):
+  start = 1
+  chunk = list(islice(rows, size))
+  while chunk:
+    yield start, chunk
+    start += len(chunk)
+    chunk = list(islice(rows, size))
+
+def _merge(schema, start, chunk, result, fieldnames):
+  columns = list(result.columns.items())
+  k = 0
+  for position, row in enumerate(chunk):
+    row_number = start + position
+    if row_number in result.errors:
+      # validate the row again in this process, to raise with its schema
+      yield check_csv_schema(schema, row, row_number, fieldnames)
+      continue
+
+    if fieldnames is not None:
+      row = zip_longest(fieldnames, row)
+    csv_row_schema = schema(row_number=row_number)
+    csv_row_schema._load(row, dict((name, column[k])
+                                   for name, column in columns))
+    k += 1
+    yield csv_row_schema
+
+def _validate_chunk(schema, rows, start, fieldnames):
+  return schema.validate_many(rows, start, fieldnames)
@@ -0,0 +1,139 @@
+"""
+JSON backends for `JsonEncoding`. The stdlib's is used unless the
+REST_JSON_BACKEND environment variable names another at import time, or is
+`fastest` for the first installed in the order of `PREFERENCE`.
+
+Every backend encodes `Decimal` as a float and `datetime` in the format
+`rest.DateTime` uses, takes subclasses of dict, list, tuple, str and int as
+the stdlib does, and returns text rather than bytes. Anything a faster backend
+can't encode, such as an int too big for it, is handed to the stdlib's. They
+still differ in one way, which is why they're opt-in: NaN and infinite floats
+are written as `null` by orjson, where the stdlib writes `NaN` and
+`Infinity`.
+"""
+from __future__ import absolute_import
+import json
+import os
+
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+import six
+from six.moves.collections_abc import Mapping
+
+
+PREFERENCE = ('orjson', 'rapidjson', 'ujson', 'json')
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+# `separator` is what the backend writes between the items of a list
+Backend = namedtuple('Backend', ('name', 'dumps', 'loads', 'separator'))
+
+
+def default(obj):
+  if isinstance(obj, Decimal):
+    return float(obj)
+  if isinstance(obj, datetime):
+    return obj.strftime(DATETIME_FORMAT)
+  # subclasses of the JSON types, which backends asked to pass them through
+  # send here, are encoded as the stdlib encoder would their base types
+  if isinstance(obj, Mapping):
+    return dict(obj.items())
+  if isinstance(obj, (list, tuple)):
+    return list(obj)
+  if isinstance(obj, six.string_types):
+    return six.text_type(obj)
+  if isinstance(obj, six.integer_types):
+    return int(obj)
+  if isinstance(obj, float):
+    return float(obj)
+  raise TypeError('%r is not JSON serializable' % (obj,))
+
+
+class DefaultEncoder(json.JSONEncoder):
+  def default(self, obj):
+    return default(obj)
+
+
+def _stdlib_dumps(obj):
+  return json.dumps(obj, cls=DefaultEncoder)
+
+def _stdlib():
+  return Backend('json', _stdlib_dumps, json.loads, ', ')
+
+def _falling_back(dumps):
+  """
+  `dumps`, handing anything it fails to encode to the stdlib encoder.
+  """
+  def dumps_or_stdlib(obj):
+    try:
+      return dumps(obj)
+    except (TypeError, ValueError, OverflowError):
+      return _stdlib_dumps(obj)
+  return dumps_or_stdlib
+
+def _orjson():
+  import orjson
+  option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS \
+    | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+  def dumps(obj):
+    return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+  return Backend('orjson', _falling_back(dumps), orjson.loads, ',')
+
+def _rapidjson():
+  import rapidjson
+
+  def dumps(obj):
+    return rapidjson.dumps(obj, default=default)
+  return Backend('rapidjson', _falling_back(dumps), rapidjson.loads, ',')
+
+def _ujson():
+  import ujson
+
+  def dumps(obj):
+    return ujson.dumps(obj, default=default)
+  return Backend('ujson', _falling_back(dumps), ujson.loads, ',')
+
+
+_LOADERS = {
+  'json':       _stdlib,
+  'orjson':     _orjson,
+  'rapidjson':  _rapidjson,
+  'ujson':      _ujson,
+}
+
+
+def load(name):
+  """
+  Load the backend called `name`, raising ImportError if its library isn't
+  installed.
+  """
+  return _LOADERS[name]()
+
+def available():
+  """
+  All of the backends which can be loaded, fastest first.
+  """
+  backends = []
+  for name in PREFERENCE:
+    try:
+      backends.append(load(name))
+    except ImportError:
+      pass
+  return backends
+
+def choose(name=None):
+  """
+  The backend called `name`, by default REST_JSON_BACKEND or else the
+  stdlib's; `fastest` picks the first installed one in `PREFERENCE`.
+  """
+  name = name or os.environ.get('REST_JSON_BACKEND') or 'json'
+  if name == 'fastest':
+    return available()[0]
+  return load(name)
+
+
+backend = choose()
@@ -0,0 +1,211 @@
+"""
+Incremental decoding of a JSON object read from a stream, for request bodies
+with one string member too big to decode in memory alongside the body, like
+the "csv" member `json_csv_upload` reads.
+"""
+from __future__ import absolute_import
+import codecs
+import json
+import re
+
+from json.decoder import scanstring
+
+import six
+
+
+# bytes read from the stream at a time
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# a run of string content made of whole characters and escapes, up to the
+# closing quote, a bad or incomplete escape or the end of the buffer
+_STRING_RUN = re.compile(r'(?:[^"\\]+|\\u[0-9a-fA-F]{4}|\\[^u])*')
+
+# characters which may continue a number the decoder stopped short of
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+_HIGH_SURROGATE = re.compile(r'\\u[dD][89abAB][0-9a-fA-F]{2}$')
+
+# the longest escape, a surrogate pair
+_MAX_ESCAPE = 12
+
+_decoder = json.JSONDecoder()
+
+
+class JsonStreamError(ValueError):
+  pass
+
+
+def stream_member(stream, key, chunk_size=CHUNK_SIZE):
+  """
+  Decode the JSON object in binary `stream` up to the string member `key`,
+  returning `(data, pieces)`. `data` is a dict of the members before `key`,
+  and `pieces` an iterator of the text of its value, read from the stream a
+  chunk at a time. Once `pieces` is exhausted, the members after `key` are
+  added to `data`.
+
+  If the object has no member `key` whose value is a string, `data` holds
+  every member and `pieces` is None. An empty body decodes as an empty
+  object. Raises `JsonStreamError` for malformed JSON, which for anything
+  after `key` happens while `pieces` is read.
+  """
+  reader = _Reader(stream, chunk_size)
+  data = {}
+  if not reader.peek():
+    return data, None
+
+  reader.expect('{')
+  if not reader.members(data, key):
+    reader.end()
+    return data, None
+  return data, _rest(reader, data)
+
+def _rest(reader, data):
+  for piece in reader.string():
+    yield piece
+  reader.members(data)
+  reader.end()
+
+
+class _Reader(object):
+  """
+  A buffer of text decoded from a stream, dropping what has been consumed each
+  time it is refilled.
+  """
+  def __init__(self, stream, chunk_size):
+    self._stream = stream
+    self._chunk_size = chunk_size
+    self._decoder = codecs.getincrementaldecoder('utf-8')()
+    self._started = False
+    self.buf = u''
+    self.pos = 0
+    self.eof = False
+
+  def fill(self):
+    """
+    Read another chunk of the stream into the buffer. Returns False if the
+    stream had already ended.
+    """
+    if self.eof:
+      return False
+    data = self._stream.read(self._chunk_size)
+    self.eof = not data
+    try:
+      text = self._decoder.decode(data, final=self.eof)
+    except UnicodeDecodeError as e:
+      raise JsonStreamError(str(e))
+    self.buf = self.buf[self.pos:] + text
+    self.pos = 0
+    return True
+
+  def peek(self):
+    """
+    Skip whitespace and return the next character, or '' at the end.
+    """
+    while True:
+      self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+      if self.pos < len(self.buf):
+        return self.buf[self.pos]
+      if not self.fill():
+        return ''
+
+  def expect(self, chars):
+    char = self.peek()
+    if not char or char not in chars:
+      raise JsonStreamError('Expecting %s' % ' or '.join(repr(c) for c in chars))
+    self.pos += 1
+    return char
+
+  def end(self):
+    if self.peek():
+      raise JsonStreamError('Extra data')
+
+  def value(self):
+    self.peek()
+    while True:
+      try:
+        value, end = _decoder.raw_decode(self.buf, self.pos)
+      except ValueError as e:
+        if self.fill():
+          continue
+        raise JsonStreamError(str(e))
+      # a number may go on in the next chunk if it reaches the end of the
+      # buffer, or stops short of a fraction or exponent cut off there
+      if not self._number_may_go_on(value, end) or not self.fill():
+        self.pos = end
+        return value
+
+  def _number_may_go_on(self, value, end):
+    if isinstance(value, bool) \
+        or not isinstance(value, six.integer_types + (float,)):
+      return False
+    return end == len(self.buf) or self.buf[end] in _NUMBER_CHARS
+
+  def members(self, data, key=None):
+    """
+    Decode members of the object into `data` until the one named `key`, if
+    its value is a string, returning True with the buffer at its opening
+    quote. Returns False at the end of the object.
+    """
+    while True:
+      if not self._started:
+        self._started = True
+        if self.peek() == '}':
+          self.pos += 1
+          return False
+      elif self.expect(',}') == '}':
+        return False
+
+      if self.peek() != '"':
+        raise JsonStreamError('Expecting property name enclosed in double '
+                              'quotes')
+      name = self.value()
+      self.expect(':')
+      if name == key and self.peek() == '"':
+        return True
+      data[name] = self.value()
+
+  def string(self):
+    """
+    Yield the text of the string at the buffer a piece at a time, leaving the
+    buffer after its closing quote.
+    """
+    self.pos += 1
+    while True:
+      buf = self.buf
+      end = _STRING_RUN.match(buf, self.pos).end()
+      closed = end < len(buf) and buf[end] == '"'
+      if not closed:
+        if len(buf) - end >= _MAX_ESCAPE:
+          raise JsonStreamError('Invalid \\escape')
+        end = self._cut(buf, end)
+
+      if end > self.pos:
+        try:
+          piece, _ = scanstring(buf[self.pos:end] + '"', 0)
+        except ValueError as e:
+          raise JsonStreamError(str(e))
+        self.pos = end
+        yield piece
+
+      if closed:
+        self.pos += 1
+        return
+      if not self.fill():
+        raise JsonStreamError('Unterminated string')
+
+  def _cut(self, buf, end):
+    """
+    Keep a high surrogate at the end of a piece of string back for its pair.
+    """
+    match = _HIGH_SURROGATE.search(buf, max(self.pos, end - 6), end)
+    if match is None:
+      return end
+    # an odd number of backslashes before it means it isn't an escape
+    start = i = match.start()
+    while i > self.pos and buf[i - 1] == '\\':
+      i -= 1
+    if (start - i) % 2:
+      return end
+    return start
@@ -0,0 +1,126 @@
+"""
+Limits on the size and shape of request bodies, checked as the body is read
+so an oversized one is turned away before it has been read or parsed in full.
+"""
+from __future__ import absolute_import
+import io
+import re
+
+
+# bytes read from the request at a time
+READ_CHUNK_SIZE = 64 * 1024
+
+_JSON_TOKENS = re.compile(br'[\[\]{}"\\]')
+
+
+class LimitExceeded(ValueError):
+  pass
+
+
+class Limits(object):
+  """
+  Limits for `rest.view` to hold request bodies to. Any left as None aren't
+  checked.
+
+  - `max_bytes`: the size of the body
+  - `max_xml_depth`: how deeply XML elements may nest
+  - `max_xml_elements`: how many elements an XML body may have
+  - `max_json_depth`: how deeply JSON arrays and objects may nest
+  """
+  def __init__(self, max_bytes=None, max_xml_depth=None, max_xml_elements=None,
+      max_json_depth=None):
+    self.max_bytes = max_bytes
+    self.max_xml_depth = max_xml_depth
+    self.max_xml_elements = max_xml_elements
+    self.max_json_depth = max_json_depth
+
+  def check_length(self, request):
+    """
+    Turn away a body which says it's too big before reading any of it.
+    """
+    length = request.content_length
+    if self.max_bytes is not None and length is not None \
+        and length > self.max_bytes:
+      raise LimitExceeded('request body is larger than %d bytes'
+                          % self.max_bytes)
+
+  def chunks(self, request):
+    """
+    Yield the body of `request` a chunk at a time, raising `LimitExceeded` as
+    soon as it is too big. It's streamed unless something has already read it,
+    such as a `before_request` hook, in which case the copy kept is checked.
+    """
+    self.check_length(request)
+    body = _cached_body(request)
+    if body is not None:
+      stream = io.BytesIO(body)
+    else:
+      stream = request.stream
+    size = 0
+    chunk = stream.read(READ_CHUNK_SIZE)
+    while chunk:
+      size += len(chunk)
+      if self.max_bytes is not None and size > self.max_bytes:
+        raise LimitExceeded('request body is larger than %d bytes'
+                            % self.max_bytes)
+      yield chunk
+      chunk = stream.read(READ_CHUNK_SIZE)
+
+  def read_json(self, request):
+    """
+    The body of `request`, checking the nesting of the JSON in it as it's
+    read.
+    """
+    depth = JsonDepth(self.max_json_depth)
+    body = []
+    for chunk in self.chunks(request):
+      if self.max_json_depth is not None:
+        depth.feed(chunk)
+      body.append(chunk)
+    return b''.join(body)
+
+
+def _cached_body(request):
+  """
+  The body `request.get_data()` has already read from the stream and kept,
+  or None. werkzeug keeps it as `_cached_data`, where `get_data` looks for it
+  too.
+  """
+  return getattr(request, '_cached_data', None)
+
+
+class JsonDepth(object):
+  """
+  Tracks how deeply nested the JSON fed to it in chunks is, without parsing
+  it, by counting brackets outside of strings.
+  """
+  def __init__(self, max_depth):
+    self.max_depth = max_depth
+    self.depth = 0
+    self._in_string = False
+    # the index in the next chunk of a character escaped by a backslash
+    self._escaped = -1
+
+  def feed(self, chunk):
+    escaped = self._escaped
+    for match in _JSON_TOKENS.finditer(chunk):
+      i = match.start()
+      if i == escaped:
+        continue
+      char = match.group()
+      if self._in_string:
+        if char == b'\\':
+          escaped = i + 1
+        elif char == b'"':
+          self._in_string = False
+      elif char == b'"':
+        self._in_string = True
+      elif char in b'[{':
+        self.depth += 1
+        if self.depth > self.max_depth:
+          raise LimitExceeded('JSON is nested deeper than %d levels'
+                              % self.max_depth)
+      elif char in b']}':
+        self.depth -= 1
+    self._escaped = escaped - len(chunk)
+
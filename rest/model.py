@@ -13,6 +13,17 @@ class Model(object):
     self._model  = None
     self._inital = None
 
+  def __get__(self, instance, owner):
+    if instance is None:
+      return self
+    return instance._values[owner._slot_of[self]]
+
+  def bind(self, memo):
+    bound = memo.get(id(self))
+    if bound is None:
+      bound = memo[id(self)] = Model(self._class)
+    return bound
+
   def set(self, model):
     self._initial = copy(model)
     self._model = model
@@ -44,6 +55,13 @@ class ModelValue(object):
     self._field_name = field_name
     self._initial = None
 
+  def bind(self, memo):
+    bound = memo.get(id(self))
+    if bound is None:
+      bound = memo[id(self)] = ModelValue(self._model.bind(memo),
+                                          self._field_name)
+    return bound
+
   def get(self):
     return getattr(self._model.get(), self._field_name)
 
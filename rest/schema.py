@@ -1,5 +1,126 @@
+from __future__ import absolute_import
+from itertools import islice
+import six
+from six.moves import zip_longest
 
+from rest.fields import Field
+
+
+# how many rows `Schema.validate_many` coerces column-wise at a time
+BATCH_CHUNK_SIZE = 1024
+
+
+def _add_errors(errors, name, errs):
+  if errs:
+    field_errors = errors.get(name, [])
+    field_errors += errs
+    errors[name] = field_errors
+
+
+def _items(data):
+  """
+  The `(name, value)` pairs of `data`, a dict or already an iterable of pairs.
+  """
+  if hasattr(data, 'items'):
+    return data.items()
+  return data
+
+
+def _class_attr(cls, name):
+  """
+  The attribute `name` as stored on `cls` or the first of its bases to have
+  it, before any descriptor binds it, or None.
+  """
+  for klass in cls.__mro__:
+    if name in vars(klass):
+      return vars(klass)[name]
+  return None
+
+
+def _coerces_column_wise(field):
+  """
+  Fields which coerce on `set` and store the result without further logic can
+  have their values coerced a column at a time.
+  """
+  cls = type(field)
+  return isinstance(field, Field) \
+      and cls.set is Field.set \
+      and cls._set is Field._set \
+      and not field._has_set
+
+
+class SchemaMeta(type):
+  """
+  Compiles the field table of a `Schema` once, when the class is created. A
+  field is any public, non-callable attribute of the class. Instances iterate
+  the precomputed plans instead of reflecting over themselves on every
+  construction, call and serialization.
+
+  The fields declared on the class are shared and never hold values. Each
+  instance binds its own copy of every field into `_values`, indexed by the
+  field's position in `_field_table`.
+
+  An instance's serialized representation can be cached as long as every
+  serialized field holds its own value, so sees every change to it.
+  """
+  def __init__(cls, name, bases, attrs):
+    super(SchemaMeta, cls).__init__(name, bases, attrs)
+
+    fields = []
+    for field_name in dir(cls):
+      if not field_name.startswith('_'):
+        field = getattr(cls, field_name)
+        if not hasattr(field, '__call__'):
+          fields.append((field_name, field))
+
+    validation = []
+    serialization = []
+    columnar = []
+    for index, (field_name, field) in enumerate(fields):
+      if _coerces_column_wise(field):
+        columnar.append((field_name, index))
+
+      if not getattr(field, 'serialize', False):
+        continue
+      # bound to each instance as it's checked, as any method, staticmethod
+      # or classmethod would be when looked up on it
+      hook = _class_attr(cls, 'validate_%s' % field_name)
+      validation.append((field_name, index, hook))
+      serialization.append((getattr(field, 'name', field_name), index))
+
+    cls._field_table = tuple(fields)
+    cls._field_index = dict((n, i) for i, (n, _) in enumerate(fields))
+    cls._slot_of = dict((f, i) for i, (_, f) in enumerate(fields))
+    cls._columnar_plan = tuple(columnar)
+    cls._validation_plan = tuple(validation)
+    cls._serialization_plan = tuple(serialization)
+    cls._caches_rep = all(isinstance(fields[i][1], Field)
+                          and not fields[i][1]._has_get
+                          for _, i in serialization)
+
+
+class BatchResult(object):
+  """
+  The outcome of `Schema.validate_many`. `valid` lists the indices of the rows
+  that passed, `errors` maps the index of every failing row to its errors, and
+  `columns` maps each field name to the coerced values of the valid rows, in
+  the same order as `valid`.
+  """
+  __slots__ = ('valid', 'errors', 'columns')
+
+  def __init__(self, valid, errors, columns):
+    self.valid = valid
+    self.errors = errors
+    self.columns = columns
+
+  def __len__(self):
+    return len(self.valid) + len(self.errors)
+
+
+@six.add_metaclass(SchemaMeta)
 class Schema(object):
+  __slots__ = ('_values', '_errors', '_rep')
+
   @classmethod
   def combined_errors(self, *args):
     errors = []
@@ -7,16 +128,114 @@ class Schema(object):
       errors.extend(list(schema._errors.items()))
     return dict(errors)
 
+  @classmethod
+  def validate_many(cls, rows, start=0, fieldnames=None):
+    """
+    Validate an iterable of dicts against this schema, reusing a single
+    instance rather than building a schema per row. Rows are read in chunks,
+    and fields that allow it are coerced a column at a time with
+    `Field.coerce_column`. Rows are numbered from `start`. Returns a
+    `BatchResult`.
+
+    When `fieldnames` is given, rows are sequences of values in that order
+    instead, as read by `csv.reader`; short rows are padded with None, as
+    `csv.DictReader` would.
+
+    Rows are set and checked here rather than through `__call__`, so a
+    subclass overriding it isn't called.
+    """
+    schema = cls()
+    values = schema._values
+    index = cls._field_index
+    valid = []
+    errors = {}
+    columns = [(name, i, []) for name, i, hook in cls._validation_plan]
+
+    positions = None
+    if fieldnames is not None:
+      positions = dict((name, p) for p, name in enumerate(fieldnames))
+
+    rows = iter(rows)
+    number = start
+    chunk = list(islice(rows, BATCH_CHUNK_SIZE))
+    while chunk:
+      coerced = {}
+      for name, i in cls._columnar_plan:
+        if positions is None:
+          column = [row.get(name, '') for row in chunk]
+        elif name in positions:
+          p = positions[name]
+          column = [row[p] if p < len(row) else None for row in chunk]
+        else:
+          continue
+        coerced[name] = values[i].coerce_column(column)
+
+      for position, row in enumerate(chunk):
+        for field in values:
+          field.reset()
+
+        if positions is None:
+          items = row.items()
+        else:
+          items = zip_longest(fieldnames, row)
+
+        row_errors = {}
+        for name, value in items:
+          if name not in index:
+            continue
+          field = values[index[name]]
+          column = coerced.get(name)
+          if column is None or value is None:
+            try:
+              errs = field.set(value)
+            except ValueError as err:
+              errs = list(err.args)
+          else:
+            errs = column[1].get(position)
+            if errs is None:
+              field._store(column[0][position])
+          _add_errors(row_errors, name, errs)
+
+        if schema._check(row_errors):
+          valid.append(number)
+          for name, i, column in columns:
+            column.append(values[i].get())
+        else:
+          errors[number] = row_errors
+        number += 1
+
+      chunk = list(islice(rows, BATCH_CHUNK_SIZE))
+
+    return BatchResult(valid, errors,
+                       dict((name, column) for name, i, column in columns))
+
   def __init__(self, **kwargs):
-    self._fields = self._get_fields()
     self._errors = {}
 
-    for name, field in self._fields.items():
+    # the cached representation, which any field setting a value drops
+    cell = self._rep = [None]
+
+    memo = {}
+    values = self._values = []
+    for name, field in self._field_table:
+      if hasattr(field, 'bind'):
+        field = field.bind(memo)
+      values.append(field)
+
       if name in kwargs:
         field.set(kwargs.pop(name))
       else:
         field.reset()
 
+      # nothing is cached yet, so the cell is only needed from here on
+      if isinstance(field, Field):
+        field._cell = cell
+
+  @property
+  def _fields(self):
+    return dict((name, self._values[i])
+                for name, i in six.iteritems(self._field_index))
+
   def get_namespace(self):
     if hasattr(self, '__namespace__'):
       return self.__namespace__
@@ -26,43 +245,61 @@ class Schema(object):
     if data is None:
       data = {}
     errors = {}
-
-    def add_errors(name, errs):
-      if errs:
-        field_errors = errors.get(name, [])
-        field_errors += errs
-        errors[name] = field_errors
+    values = self._values
+    index = self._field_index
 
     # First, set the values on the field. If anything goes wrong, it'll return
-    # a list of errors
-    for name, value in data.items():
-      if name not in self._fields:
+    # a list of errors. `data` may also be an iterable of (name, value) pairs
+    for name, value in _items(data):
+      if name not in index:
         continue
       try:
-        errs = self._fields[name].set(value)
+        errs = values[index[name]].set(value)
       except ValueError as err:
-        errs = [err.message]
-      add_errors(name, errs)
+        errs = list(err.args)
+      _add_errors(errors, name, errs)
+
+    return self._check(errors)
+
+  def _load(self, data, coerced):
+    """
+    Populate the schema with `coerced`, values keyed by field name which
+    `validate_many` has already coerced and validated, without checking them
+    again. Any other fields present in `data` are set as usual.
+    """
+    values = self._values
+    index = self._field_index
+    for name, value in _items(data):
+      if name in index and name not in coerced:
+        values[index[name]].set(value)
+    for name, value in coerced.items():
+      values[index[name]]._store(value)
+
+  def _check(self, errors):
+    """
+    Apply defaults and run every validator over the values already set,
+    adding to `errors`.
+    """
+    values = self._values
+    plan = self._validation_plan
 
     # Check to see if we need to default to defalut values
-    for name, field in self._fields.items():
-      if not field.serialize:
-        continue
-      field.default()
+    for name, i, hook in plan:
+      values[i].default()
 
     # Then, now the everything's been set, run all the field validators.
-    for name, field in self._fields.items():
-      if not field.serialize:
-        continue
+    for name, i, hook in plan:
+      field = values[i]
       errs = field.validate()
-      add_errors(name, errs)
+      _add_errors(errors, name, errs)
 
-      validator = 'validate_%s' % name
-      if hasattr(self, validator):
+      if hook is not None:
+        if hasattr(hook, '__get__'):
+          hook = hook.__get__(self, type(self))
         try:
-          getattr(self, validator)(field.get())
+          hook(field.get())
         except ValueError as v:
-          add_errors(name, v.args)
+          _add_errors(errors, name, v.args)
 
     self._errors = errors
     return not bool(errors)
@@ -70,23 +307,24 @@ class Schema(object):
   def __repr__(self):
     return str(self._get())
 
-  def _get(self):
-    rep = {}
-    for name, field in self._fields.items():
-      if field.serialize:
-        name = getattr(field, 'name', name)
-        rep[name] = field.get_simplified()
-    rep['__namespace__'] = self.get_namespace()
+  def _get(self, namespace=True):
+    """
+    The simplified values of the serialized fields, keyed by name. The result
+    is cached until a field changes, and each call returns a copy of it.
+    """
+    rep = self._rep[0]
+    if rep is None:
+      rep = {}
+      values = self._values
+      for name, i in self._serialization_plan:
+        rep[name] = values[i].get_simplified()
+      if self._caches_rep:
+        self._rep[0] = rep
+
+    rep = dict(rep)
+    if namespace:
+      rep['__namespace__'] = self.get_namespace()
     return rep
 
   def dict(self):
     return self._get()
-
-  def _get_fields(self):
-    fields = {}
-    for field_name in dir(self):
-      if not field_name.startswith('_'):
-        field = getattr(self, field_name)
-        if not hasattr(field, '__call__'):
-          fields[field_name] = field
-    return fields
@@ -1,16 +1,33 @@
 from __future__ import absolute_import
 import re
 
+import six
 
+from rest.cache import LRUCache
+
+
+def _builtin(kind, *params):
+  """
+  Mark a validator as one `fuse` knows how to inline, with the parameters it
+  was made with.
+  """
+  def mark(validator):
+    validator._fusable = (kind,) + params
+    return validator
+  return mark
+
+@_builtin('required')
 def required(value):
   if value is None:
     return ['is required']
 
+@_builtin('nonempty')
 def nonempty(value):
   if not value:
     return ['cannot be empty']
 
 def number_range(min=None, max=None):
+  @_builtin('number_range', min, max)
   def test_range(value):
     if value is not None:
       if min is not None and value < min:
@@ -20,6 +37,7 @@ def number_range(min=None, max=None):
   return test_range
 
 def length(min=None, max=None):
+  @_builtin('length', min, max)
   def test_len(value):
     if value is not None:
       if min is not None and len(value) < min:
@@ -28,24 +46,199 @@ def length(min=None, max=None):
         return ['cannot be greater than %s characters' % str(max)]
   return test_len
 
-def regex(expr, msg):
+def regex(expr, msg, fullmatch=False, prefilter=None):
+  """
+  A validator failing non-empty values `expr` isn't found in with `msg`, or
+  with `fullmatch` which it doesn't match in full. `prefilter` is a cheap test
+  run first, which fails a value without the regex when it returns False, so
+  it must only do so for values the regex would fail too.
+  """
+  pattern = re.compile(expr)
+  if not fullmatch:
+    match = pattern.search
+  elif hasattr(pattern, 'fullmatch'):
+    match = pattern.fullmatch
+  else:
+    match = re.compile(r'(?:%s)\Z' % expr).match
+
+  @_builtin('regex', match, msg, prefilter)
   def contains_regex(value):
-    if value and not re.search(expr, value):
+    if value and not ((prefilter is None or prefilter(value))
+                      and match(value)):
       return [msg]
 
   return contains_regex
 
+def _http_scheme(value):
+  # anything but a string goes to the regex, to fail as it would there
+  return not isinstance(value, six.string_types) \
+    or value.startswith(('http://', 'https://'))
+
+def _has_at(value):
+  return not isinstance(value, six.string_types) or '@' in value
+
 url = regex(r'^http(s)?://([^/:]+\.[a-z]{2,10}|' + \
               r'([0-9]{1,3}\.){3}[0-9]{1,3})(:[0-9]+)?(\/.*)?$',
-            'must be a valid HTTP URL')
+            'must be a valid HTTP URL', prefilter=_http_scheme)
 
 email = regex(r'(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)',
-              'must be a valid email')
+              'must be a valid email', prefilter=_has_at)
 
 def multiple_choice(choices):
+  lookup = _choice_set(choices)
 
+  @_builtin('multiple_choice', lookup, choices)
   def assert_choice_in_choices(value):
-    if value not in choices:
+    if _not_in(value, lookup, choices):
       return ['Invalid selection %s' % value]
 
   return assert_choice_in_choices
+
+def _choice_set(choices):
+  """
+  The choices as a set to look values up in, or None if they can't be one.
+  """
+  if not isinstance(choices, (list, tuple, set, frozenset)):
+    return None
+  try:
+    return frozenset(choices)
+  except TypeError:
+    return None
+
+def _not_in(value, lookup, choices):
+  if lookup is not None:
+    try:
+      return value not in lookup
+    except TypeError:
+      # an unhashable value, which may still equal one of the choices
+      pass
+  return value not in choices
+
+
+# code generated for each shape of validators - their kinds in order, and
+# which of their optional parts they use - as a function making a check from
+# their parameters. there are only so many shapes, however many fields and
+# validators there are
+_factories = LRUCache(maxsize=256)
+
+def fuse(validators):
+  """
+  A single function checking a value against every validator in
+  `validators`, returning a list of their errors in order. The built-in
+  validators above are inlined into it rather than called, so a field pays
+  for one call however many of them it has; any others are called as they
+  are.
+  """
+  shape = []
+  params = []
+  for validator in validators:
+    part, args = _shape_of(validator)
+    shape.append(part)
+    params.extend(args)
+
+  shape = tuple(shape)
+  factory = _factories.get(shape)
+  if factory is None:
+    factory = _factory(shape)
+    _factories.set(shape, factory)
+  return factory(*params)
+
+def _shape_of(validator):
+  """
+  The part of a shape `validator` makes, and the parameters it needs.
+  """
+  spec = getattr(validator, '_fusable', None)
+  kind = spec[0] if spec is not None else None
+
+  if kind in ('required', 'nonempty'):
+    return (kind,), ()
+  if kind in ('number_range', 'length'):
+    low, high = spec[1:]
+    unit = '' if kind == 'number_range' else ' characters'
+    args = []
+    if low is not None:
+      args += [low, 'cannot be less than %s%s' % (str(low), unit)]
+    if high is not None:
+      args += [high, 'cannot be greater than %s%s' % (str(high), unit)]
+    return (kind, low is not None, high is not None), tuple(args)
+  if kind == 'regex':
+    match, msg, prefilter = spec[1:]
+    if prefilter is None:
+      return (kind, False), (match, msg)
+    return (kind, True), (match, msg, prefilter)
+  if kind == 'multiple_choice':
+    lookup, choices = spec[1:]
+    if lookup is None:
+      return (kind, False), (choices,)
+    return (kind, True), (lookup, choices)
+  return ('call',), (validator,)
+
+def _factory(shape):
+  params = []
+  lines = []
+
+  def param():
+    name = 'p%d' % len(params)
+    params.append(name)
+    return name
+
+  for part in shape:
+    kind = part[0]
+    if kind == 'required':
+      lines += ['if value is None:',
+                '  errors.append(%r)' % 'is required']
+    elif kind == 'nonempty':
+      lines += ['if not value:',
+                '  errors.append(%r)' % 'cannot be empty']
+    elif kind in ('number_range', 'length'):
+      has_low, has_high = part[1:]
+      if not has_low and not has_high:
+        continue
+      measured = 'value'
+      lines.append('if value is not None:')
+      if kind == 'length':
+        measured = 'n'
+        lines.append('  n = len(value)')
+      branch = 'if'
+      if has_low:
+        low, msg = param(), param()
+        lines += ['  if %s < %s:' % (measured, low),
+                  '    errors.append(%s)' % msg]
+        branch = 'elif'
+      if has_high:
+        high, msg = param(), param()
+        lines += ['  %s %s > %s:' % (branch, measured, high),
+                  '    errors.append(%s)' % msg]
+    elif kind == 'regex':
+      match, msg = param(), param()
+      if part[1]:
+        lines.append('if value and not (%s(value) and %s(value)):'
+                     % (param(), match))
+      else:
+        lines.append('if value and not %s(value):' % match)
+      lines.append('  errors.append(%s)' % msg)
+    elif kind == 'multiple_choice':
+      if part[1]:
+        lookup, choices = param(), param()
+        lines += ['try:',
+                  '  missing = value not in %s' % lookup,
+                  'except TypeError:',
+                  '  missing = value not in %s' % choices]
+      else:
+        lines.append('missing = value not in %s' % param())
+      lines += ['if missing:',
+                "  errors.append('Invalid selection %s' % value)"]
+    else:
+      lines += ['error = %s(value)' % param(),
+                'if error:',
+                '  errors += error']
+
+  source = ['def make(%s):' % ', '.join(params),
+            '  def check(value):',
+            '    errors = []']
+  source += ['    ' + line for line in lines]
+  source += ['    return errors',
+             '  return check']
+  names = {}
+  exec('\n'.join(source), names)
+  return names['make']
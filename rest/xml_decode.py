@@ -0,0 +1,108 @@
+"""
+Decoding of XML into the dicts `XmlEncoding.etree_to_dict` makes, in a single
+pass over the parser's events, without building an element tree or
+recursing. Set the REST_XML_PARSER environment variable to "lxml" to parse
+with lxml when it's installed. It isn't the default: calling back into Python
+for every event, it's a little slower than the stdlib's expat parser.
+"""
+from __future__ import absolute_import
+import os
+
+from xml.etree import ElementTree
+
+from rest.limits import LimitExceeded
+
+try:
+  from lxml import etree as lxml_etree
+except ImportError:
+  lxml_etree = None
+
+
+def parser(target):
+  """
+  An XML parser feeding `target`, lxml's if it was asked for and can be used.
+  """
+  if lxml_etree is not None and os.environ.get('REST_XML_PARSER') == 'lxml':
+    # entities are left unresolved, as the stdlib parser leaves them
+    return lxml_etree.XMLParser(target=target, resolve_entities=False)
+  return ElementTree.XMLParser(target=target)
+
+def parse(chunks, max_depth=None, max_elements=None):
+  """
+  Decode XML fed from an iterable of chunks into a dict of the root element,
+  raising `LimitExceeded` as soon as it nests deeper than `max_depth` or has
+  more than `max_elements` elements.
+  """
+  builder = DictBuilder(max_depth, max_elements)
+  xml_parser = parser(builder)
+  for chunk in chunks:
+    xml_parser.feed(chunk)
+  return xml_parser.close()
+
+def loads(data):
+  return parse([data])
+
+
+class DictBuilder(object):
+  """
+  A parser target which builds `{root tag: value}` as `etree_to_dict` would.
+  An element's value is a dict of its children's values keyed by tag, a list
+  of them where a tag repeats, with its attributes as "@name" and its text as
+  "#text". An element with neither children nor attributes is just its text.
+  """
+  def __init__(self, max_depth=None, max_elements=None):
+    self.max_depth = max_depth
+    self.max_elements = max_elements
+    self.elements = 0
+    # [tag, attrib, children, text] for each open element. `children` is set
+    # once the first child starts, which ends the element's text
+    self._stack = []
+    self._root = None
+
+  def start(self, tag, attrib):
+    stack = self._stack
+    if stack and stack[-1][2] is None:
+      stack[-1][2] = {}
+
+    self.elements += 1
+    if self.max_depth is not None and len(stack) >= self.max_depth:
+      raise LimitExceeded('XML is nested deeper than %d elements'
+                          % self.max_depth)
+    if self.max_elements is not None and self.elements > self.max_elements:
+      raise LimitExceeded('XML has more than %d elements' % self.max_elements)
+    stack.append([tag, attrib, None, []])
+
+  def data(self, data):
+    if self._stack:
+      frame = self._stack[-1]
+      if frame[2] is None:
+        frame[3].append(data)
+
+  def end(self, tag):
+    tag, attrib, children, text = self._stack.pop()
+    text = u''.join(text)
+
+    if children is None and not attrib:
+      value = text.strip() if text else None
+    else:
+      value = {} if children is None else children
+      for k, v in attrib.items():
+        value['@' + k] = v
+      text = text.strip()
+      if text:
+        value['#text'] = text
+
+    if not self._stack:
+      self._root = {tag: value}
+      return
+
+    siblings = self._stack[-1][2]
+    if tag not in siblings:
+      siblings[tag] = value
+    elif isinstance(siblings[tag], list):
+      siblings[tag].append(value)
+    else:
+      siblings[tag] = [siblings[tag], value]
+
+  def close(self):
+    return self._root
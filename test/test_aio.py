@@ -0,0 +1,348 @@
+from __future__ import absolute_import
+import asyncio
+import gc
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps
+from json import loads
+from unittest import TestCase as UnitTestCase
+
+import flask
+from flask import Flask
+from flask_testing import TestCase
+from nose.plugins.skip import SkipTest
+import six
+
+import rest
+from rest import aio
+from rest.schema import Schema
+
+try:
+  import asgiref
+except ImportError:
+  asgiref = None
+
+
+class DogSchema(Schema):
+  dog_type = rest.String(validators=[rest.nonempty])
+  food     = rest.String(validators=[rest.nonempty])
+  pounds   = rest.Int()
+
+
+class CheckedDogSchema(DogSchema):
+  def validate_food(self, value):
+    if value == flask.current_app.config['BANNED_FOOD']:
+      raise ValueError('not for dogs')
+
+
+class TestAsyncView(TestCase):
+  def setUp(self):
+    if asgiref is None:
+      raise SkipTest('async views need asgiref')
+
+    @self.app.route('/dogs', methods=['GET', 'POST'])
+    @rest.async_view
+    async def dogs(data=None):
+      await asyncio.sleep(0)
+      if data is not None:
+        return DogSchema(**data)
+      return [DogSchema(dog_type='dog %d' % i, food='kibble', pounds=i)
+              for i in range(3)]
+
+    @self.app.route('/streamed')
+    @rest.async_view(stream=True)
+    async def streamed():
+      return iter([{'name': 'shibe'}, {'name': 'dane'}])
+
+    @self.app.route('/limited', methods=['POST'])
+    @rest.async_view(limits=rest.Limits(max_bytes=10))
+    async def limited(data):
+      return data
+
+    @self.app.route('/error')
+    @rest.async_view
+    async def error():
+      return rest.error({'client': ['bad dog']})
+
+    @self.app.route('/lazy')
+    @rest.async_view
+    async def lazy():
+      # encoded in the executor, as a lazy query would be
+      return ({'app': flask.current_app.name, 'n': n} for n in range(2))
+
+    @self.app.route('/form', methods=['POST'])
+    @rest.async_view
+    async def form(data):
+      return dict(data)
+
+    @self.app.route('/sync_form', methods=['POST'])
+    @rest.view
+    def sync_form(data):
+      return dict(data)
+
+  def create_app(self):
+    self.app = Flask('TestAsyncView')
+    return self.app
+
+  def test_get(self):
+    resp = self.client.get('/dogs')
+    self.assert200(resp)
+    self.assertEquals(['dog 0', 'dog 1', 'dog 2'],
+      [dog['dog_type'] for dog in loads(resp.get_data(as_text=True))])
+
+  def test_post(self):
+    body = {'dog_type': 'shibe', 'food': 'kibble', 'pounds': 20}
+    resp = self.client.post('/dogs', data=dumps(body))
+    self.assert200(resp)
+    self.assertEquals(body, loads(resp.get_data(as_text=True)))
+
+  def test_large_post_decoded_in_executor(self):
+    body = {'dog_type': 'shibe', 'food': 'kibble' * aio.OFFLOAD_BYTES}
+    resp = self.client.post('/dogs', data=dumps(body))
+    self.assert200(resp)
+    self.assertEquals(body['food'], loads(resp.get_data(as_text=True))['food'])
+
+  def test_bad_body(self):
+    resp = self.client.post('/dogs', data='{"dog_type":')
+    self.assert400(resp)
+
+  def test_limits(self):
+    resp = self.client.post('/limited', data=dumps({'name': 'shibe'}))
+    self.assert_status(resp, 413)
+
+  def test_streamed(self):
+    resp = self.client.get('/streamed')
+    self.assertTrue(resp.is_streamed)
+    self.assertEquals([{'name': 'shibe'}, {'name': 'dane'}],
+                      loads(resp.get_data(as_text=True)))
+
+  def test_error(self):
+    resp = self.client.get('/error')
+    self.assert400(resp)
+    self.assertEquals({'client': ['bad dog']},
+                      loads(resp.get_data(as_text=True)))
+
+  def test_xml(self):
+    resp = self.client.get('/dogs', headers={'Accept': 'text/xml'})
+    self.assert200(resp)
+    self.assertIn(b'<dog_type>dog 0</dog_type>', resp.data)
+
+  def test_app_context_while_encoding(self):
+    resp = self.client.get('/lazy')
+    self.assert200(resp)
+    self.assertEquals([{'app': 'TestAsyncView', 'n': 0},
+                       {'app': 'TestAsyncView', 'n': 1}],
+                      loads(resp.get_data(as_text=True)))
+
+  def test_form_over_max_content_length(self):
+    self.app.config['MAX_CONTENT_LENGTH'] = 100
+    body = {'name': 'x' * aio.OFFLOAD_BYTES * 2}
+    expected = self.client.post('/sync_form', data=body)
+    self.assertNotEquals(200, expected.status_code)
+
+    resp = self.client.post('/form', data=body)
+    self.assert_status(resp, expected.status_code)
+    self.assertEquals(expected.data, resp.data)
+
+    self.assert200(self.client.post('/form', data={'name': 'shibe'}))
+
+
+class TestAsyncCSVUpload(TestCase):
+  def setUp(self):
+    if asgiref is None:
+      raise SkipTest('async views need asgiref')
+    self.seen = []
+
+    @self.app.route('/csv', methods=['POST'])
+    @rest.async_csv_upload(DogSchema)
+    async def csv(rows):
+      async for schema in rows:
+        self.seen.append(schema.dog_type.get())
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_batches', methods=['POST'])
+    @rest.async_csv_upload(DogSchema, batch_size=500)
+    async def csv_batches(rows):
+      async for batch in rows:
+        self.seen.append([row['dog_type'] for row in batch])
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_columns', methods=['POST'])
+    @rest.async_csv_upload(DogSchema, batch_size=2, as_columns=True)
+    async def csv_columns(rows):
+      async for batch in rows:
+        self.seen.append(batch)
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_checked', methods=['POST'])
+    @rest.async_csv_upload(CheckedDogSchema)
+    async def csv_checked(rows):
+      async for schema in rows:
+        self.seen.append(schema.dog_type.get())
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_all_errors', methods=['POST'])
+    @rest.async_csv_upload(DogSchema, collect_errors=True)
+    async def csv_all_errors(rows):
+      async for schema in rows:
+        self.seen.append(schema.dog_type.get())
+      return rest.created({'csv': 'created'})
+
+  def create_app(self):
+    self.app = Flask('TestAsyncCSVUpload')
+    return self.app
+
+  def upload(self, path, data):
+    return self.client.post(path, data={
+      'file': (six.BytesIO(data.encode('utf-8')), 'test.csv')},
+      headers={'content-type': 'multipart/form-data'})
+
+  def test_valid(self):
+    rows = ['dog %d,kibble,%d' % (i, i) for i in range(1200)]
+    resp = self.upload('/csv', 'dog_type,food,pounds\n' + '\n'.join(rows))
+    self.assert_status(resp, 201)
+    self.assertEquals(['dog %d' % i for i in range(1200)], self.seen)
+
+  def test_batches(self):
+    rows = ['dog %d,kibble,%d' % (i, i) for i in range(1200)]
+    resp = self.upload('/csv_batches',
+                       'dog_type,food,pounds\n' + '\n'.join(rows))
+    self.assert_status(resp, 201)
+    self.assertEquals([500, 500, 200], [len(batch) for batch in self.seen])
+    self.assertEquals('dog 1199', self.seen[-1][-1])
+
+  def test_batches_as_columns(self):
+    data = 'dog_type,food,pounds\nshibe,kibble,20\ndane,meat,5\npug,kibble,8\n'
+    resp = self.upload('/csv_columns', data)
+    self.assert_status(resp, 201)
+    self.assertEquals([
+      {'dog_type': ['shibe', 'dane'], 'food': ['kibble', 'meat'],
+       'pounds': [20, 5]},
+      {'dog_type': ['pug'], 'food': ['kibble'], 'pounds': [8]},
+    ], self.seen)
+
+  def test_batch_options_as_for_csv_upload(self):
+    self.assertRaises(ValueError, rest.async_csv_upload, DogSchema,
+                      batch_size=10, parallel=2)
+    self.assertRaises(ValueError, rest.async_csv_upload, DogSchema,
+                      as_columns=True)
+
+  def test_invalid_row_in_a_batch(self):
+    data = 'dog_type,food,pounds\nshibe,kibble,20\n,kibble,10\ndane,meat,5\n'
+    resp = self.upload('/csv_batches', data)
+    self.assert400(resp)
+    self.assertEquals([['shibe']], self.seen)
+
+  def test_invalid_row(self):
+    data = 'dog_type,food,pounds\nshibe,kibble,20\n,kibble,10\ndane,meat,5\n'
+    resp = self.upload('/csv', data)
+    self.assert400(resp)
+    self.assertEquals(['shibe'], self.seen)
+    self.assertIn('dog_type', loads(resp.get_data(as_text=True)))
+
+  def test_over_max_content_length(self):
+    self.app.config['MAX_CONTENT_LENGTH'] = 100
+    rows = ['dog %d,kibble,%d' % (i, i) for i in range(1000)]
+    resp = self.upload('/csv', 'dog_type,food,pounds\n' + '\n'.join(rows))
+    self.assert_status(resp, 413)
+    self.assertEquals([], self.seen)
+
+  def test_app_context_in_the_worker(self):
+    self.app.config['BANNED_FOOD'] = 'chocolate'
+    data = 'dog_type,food,pounds\nshibe,kibble,20\ndane,chocolate,5\n'
+    resp = self.upload('/csv_checked', data)
+    self.assert400(resp)
+    self.assertEquals({'food': ['not for dogs']},
+                      loads(resp.get_data(as_text=True)))
+    self.assertEquals(['shibe'], self.seen)
+
+  def test_collect_errors(self):
+    data = 'dog_type,food,pounds\nshibe,,20\n,kibble,10\n'
+    resp = self.upload('/csv_all_errors', data)
+    self.assert400(resp)
+    self.assertEquals([], self.seen)
+
+
+class TestExports(UnitTestCase):
+
+  def test_exported_with_flask_async_support(self):
+    supported = hasattr(Flask, 'ensure_sync') and asgiref is not None
+    self.assertEquals(supported, hasattr(rest, 'async_view'))
+    self.assertEquals(supported, hasattr(rest, 'async_csv_upload'))
+
+
+class TestPipeline(UnitTestCase):
+
+  def collect(self, iterable, **kwargs):
+    async def collect():
+      items = []
+      try:
+        async for item in aio.pipeline(iterable, **kwargs):
+          items.append(item)
+      except ValueError as e:
+        items.append(str(e))
+      return items
+    return asyncio.run(collect())
+
+  def test_items(self):
+    self.assertEquals(list(range(10)), self.collect(range(10), chunk_size=3))
+
+  def test_batches(self):
+    self.assertEquals([[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]],
+                      self.collect(range(10), batch_size=4))
+
+  def test_empty(self):
+    self.assertEquals([], self.collect([]))
+    self.assertEquals([], self.collect([], batch_size=4))
+
+  def test_items_before_an_error(self):
+    def items():
+      yield 1
+      yield 2
+      raise ValueError('bad')
+    self.assertEquals([1, 2, 'bad'], self.collect(items(), chunk_size=10))
+    self.assertEquals([[1], [2], 'bad'], self.collect(items(), batch_size=1))
+
+  def test_backpressure(self):
+    pulled = []
+    def items():
+      for i in range(100):
+        pulled.append(i)
+        yield i
+
+    async def first():
+      rows = aio.pipeline(items(), batch_size=1, queue_size=2)
+      batch = await rows.__anext__()
+      # give the worker time to fill the queue
+      await asyncio.sleep(0.05)
+      ahead = len(pulled)
+      await rows.aclose()
+      return batch, ahead
+
+    unraisable = []
+    hook, sys.unraisablehook = sys.unraisablehook, unraisable.append
+    try:
+      batch, ahead = asyncio.run(first())
+      gc.collect()
+    finally:
+      sys.unraisablehook = hook
+
+    self.assertEquals([0], batch)
+    # the batch taken, two on the queue and one waiting for room
+    self.assertTrue(ahead <= 4, ahead)
+    self.assertEquals([], [u.exc_value for u in unraisable])
+
+  def test_worker_finished_once_closed(self):
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def stop_early():
+      rows = aio.pipeline(iter(range(100000)), batch_size=10, queue_size=1,
+                          executor=executor)
+      async for batch in rows:
+        break
+      await rows.aclose()
+
+    asyncio.run(stop_early())
+    # the executor's only thread is free for other work again
+    self.assertEquals(1, executor.submit(lambda: 1).result(timeout=1))
+    executor.shutdown()
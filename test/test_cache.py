@@ -0,0 +1,51 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from rest.cache import LRUCache
+from rest.cache import ResponseCache
+
+
+class TestLRUCache(TestCase):
+
+  def test_evicts_least_recently_used(self):
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    self.assertEquals(1, cache.get('a'))
+    self.assertEquals(None, cache.get('b'))
+    self.assertEquals(3, cache.get('c'))
+
+  def test_discard(self):
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.discard('a')
+    cache.discard('b')
+    self.assertFalse('a' in cache)
+
+
+class TestResponseCache(TestCase):
+
+  def setUp(self):
+    self.now = 100.0
+    self.cache = ResponseCache(maxsize=2, ttl=10, clock=lambda: self.now)
+
+  def test_entries_expire(self):
+    self.cache.set('a', 1)
+    self.now += 9
+    self.assertEquals(1, self.cache.get('a'))
+    self.now += 1
+    self.assertEquals('gone', self.cache.get('a', 'gone'))
+    self.assertEquals(0, len(self.cache))
+
+  def test_entries_without_ttl_never_expire(self):
+    cache = ResponseCache(ttl=None, clock=lambda: self.now)
+    cache.set('a', 1)
+    self.now += 1e9
+    self.assertEquals(1, cache.get('a'))
+
+  def test_still_bounded(self):
+    for key in 'abc':
+      self.cache.set(key, key)
+    self.assertEquals(2, len(self.cache))
@@ -0,0 +1,54 @@
+from __future__ import absolute_import
+import zlib
+from unittest import TestCase
+
+from flask import Flask
+from flask import request
+
+from rest import compression
+
+
+def decompress(data, encoding):
+  if encoding == 'br':
+    import brotli
+    return brotli.decompress(data)
+  wbits = 16 + zlib.MAX_WBITS if encoding == 'gzip' else zlib.MAX_WBITS
+  return zlib.decompress(data, wbits)
+
+
+class TestCompression(TestCase):
+
+  def test_compress(self):
+    data = b'{"name": "shibe"}' * 100
+    for encoding in compression.encodings():
+      compressed = compression.compress(data, encoding)
+      self.assertTrue(len(compressed) < len(data))
+      self.assertEquals(data, decompress(compressed, encoding))
+
+  def test_compress_text(self):
+    self.assertEquals(u'niño'.encode('utf-8'),
+      decompress(compression.compress(u'niño', 'gzip'), 'gzip'))
+
+  def test_iter_compress(self):
+    chunks = [u'[', u'{"name": "shibe"}', u', {"name": "dane"}', u']']
+    for encoding in compression.encodings():
+      compressed = list(compression.iter_compress(iter(chunks), encoding))
+      self.assertTrue(len(compressed) > 1)
+      self.assertEquals(u''.join(chunks).encode('utf-8'),
+                        decompress(b''.join(compressed), encoding))
+
+  def test_each_chunk_can_be_read_as_it_arrives(self):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    chunks = compression.iter_compress([b'first', b'second'], 'gzip')
+    self.assertEquals(b'first', decompressor.decompress(next(chunks)))
+    self.assertEquals(b'second', decompressor.decompress(next(chunks)))
+
+  def test_negotiate(self):
+    app = Flask('TestCompression')
+    for accept, expected in [('gzip, deflate', 'gzip'),
+                             ('deflate', 'deflate'),
+                             ('identity', None),
+                             ('', None)]:
+      headers = {'Accept-Encoding': accept}
+      with app.test_request_context('/', headers=headers):
+        self.assertEquals(expected, compression.negotiate(request))
@@ -1,15 +1,28 @@
 from __future__ import absolute_import
 import json
+import os
 import unittest
 
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
 from flask import Flask
 from flask import request
 from flask_testing import TestCase
 from werkzeug.datastructures import Headers
+from werkzeug.datastructures import MultiDict
 
 import rest
 
 
+Point = namedtuple('Point', ('x', 'y'))
+
+
+class Label(str):
+  pass
+
+
 class TestXmlEncoding(unittest.TestCase):
   def setUp(self):
     super(TestXmlEncoding, self).setUp()
@@ -69,13 +82,132 @@ class TestXmlEncoding(unittest.TestCase):
     xml = self.codec.encode({'cool': True}).decode()
     self.assertTrue('<cool>true</cool>' in xml)
 
+  def test_numbers_one_and_zero_are_booleans(self):
+    xml = self.codec.encode({'one': 1, 'zero': 0}).decode()
+    self.assertTrue('<one>true</one>' in xml)
+    self.assertTrue('<zero>false</zero>' in xml)
+
+  def test_dict_values_are_their_keys(self):
+    xml = self.codec.encode({'field': {'a': 1}}).decode()
+    self.assertTrue(xml.endswith('<body><field>a</field></body>'))
+
+  def test_nested_numbers_are_not_booleans(self):
+    codec = rest.encoding.NestedXmlEncoding('body')
+    xml = codec.encode({'one': 1, 'zero': 0, 'yes': True}).decode()
+    self.assertTrue('<one>1</one>' in xml)
+    self.assertTrue('<zero>0</zero>' in xml)
+    self.assertTrue('<yes>true</yes>' in xml)
+
+  def test_nested_dicts(self):
+    codec = rest.encoding.NestedXmlEncoding('body')
+    xml = codec.encode({'rows': [
+      {'row': 2, 'errors': {'food': ['cannot be empty']}},
+      {'row': 3, 'errors': {'pounds': ['Invalid integer']}},
+    ]}).decode()
+    self.assertTrue(xml.endswith(
+      '<body><rows><row>2</row><errors><food>cannot be empty</food></errors>'
+      '</rows><rows><row>3</row><errors><pounds>Invalid integer</pounds>'
+      '</errors></rows></body>'))
+
+  def test_encode_does_not_modify_the_payload(self):
+    dct = {'name': 'steve', '__namespace__': 'Friend'}
+    xml = self.codec.encode(dct).decode()
+    self.assertTrue(xml.endswith('<Friend><name>steve</name></Friend>'))
+    self.assertEquals({'name': 'steve', '__namespace__': 'Friend'}, dct)
+
+  def test_iter_encode_matches_encode(self):
+    items = [{'name': 'steve', '__namespace__': 'Friend'},
+             {'name': 'bob', 'friends': ['steve', 'frank']}]
+    streamed = b''.join(self.codec.iter_encode(dict(i) for i in items))
+    self.assertEquals(self.codec.encode([dict(i) for i in items]), streamed)
+
+  def test_iter_encode_empty(self):
+    self.assertEquals(self.codec.encode([]),
+                      b''.join(self.codec.iter_encode([])))
+
   def test_json_excludes_namespace(self):
     codec = rest.encoding.JsonEncoding('ns')
     dct = {
       'name':           'Steve',
       '__namespace__':  'Buds',
     }
-    self.assertEquals('{"name": "Steve"}', codec.encode(dct))
+    self.assertEquals({'name': 'Steve'}, json.loads(codec.encode(dct)))
+    self.assertEquals('Buds', dct['__namespace__'])
+
+  def test_json_simplifies_schemas_without_namespace(self):
+    class BudSchema(rest.Schema):
+      name = rest.String()
+
+    codec = rest.encoding.JsonEncoding('ns')
+    self.assertEquals({'name': 'Steve'}, codec.simplify(BudSchema(name='Steve')))
+    self.assertEquals({'name': 'Steve'},
+                      codec.simplify({'name': 'Steve', '__namespace__': 'Bud'}))
+
+
+class TestJsonBackends(unittest.TestCase):
+  payload = {
+    'price':          Decimal('1.50'),
+    'when':           datetime(2012, 4, 20, 16, 20, 1, 101000),
+    'names':          [u'Nina\u2019s', 'bob'],
+    'nested':         {'count': 3, 'ok': True, 'none': None},
+  }
+
+  expected = {
+    'price':          1.5,
+    'when':           '2012-04-20T16:20:01.101000Z',
+    'names':          [u'Nina\u2019s', 'bob'],
+    'nested':         {'count': 3, 'ok': True, 'none': None},
+  }
+
+  def test_stdlib_is_always_available(self):
+    names = [backend.name for backend in rest.json_backend.available()]
+    self.assertEquals('json', names[-1])
+
+  def test_backends_encode_equivalently(self):
+    for backend in rest.json_backend.available():
+      encoded = backend.dumps(self.payload)
+      self.assertTrue(isinstance(encoded, type(u'')), backend.name)
+      self.assertEquals(self.expected, json.loads(encoded), backend.name)
+      self.assertEquals(self.expected, backend.loads(encoded), backend.name)
+
+  def test_backends_encode_subclasses_as_the_stdlib_does(self):
+    payload = {
+      'form':   MultiDict([('a', 'x'), ('a', 'y')]),
+      'point':  Point(1, 2),
+      'points': [Point(3, 4)],
+      'label':  Label('shibe'),
+      'big':    2 ** 70,
+    }
+    expected = json.loads(json.dumps(payload))
+    self.assertEquals({'a': 'x'}, expected['form'])
+    for backend in rest.json_backend.available():
+      self.assertEquals(expected, json.loads(backend.dumps(payload)),
+                        backend.name)
+
+  def test_backends_raise_type_error_for_unknown_types(self):
+    for backend in rest.json_backend.available():
+      self.assertRaises(TypeError, backend.dumps, {'a': object()})
+
+  def test_stdlib_is_the_default(self):
+    forced = os.environ.pop('REST_JSON_BACKEND', None)
+    try:
+      self.assertEquals('json', rest.json_backend.choose().name)
+    finally:
+      if forced is not None:
+        os.environ['REST_JSON_BACKEND'] = forced
+    self.assertEquals(rest.json_backend.available()[0].name,
+                      rest.json_backend.choose('fastest').name)
+
+  def test_list_separator(self):
+    for backend in rest.json_backend.available():
+      self.assertEquals('[1%s2]' % backend.separator, backend.dumps([1, 2]))
+
+  def test_codec_strips_namespace_for_every_backend(self):
+    codec = rest.encoding.JsonEncoding('ns')
+    for backend in rest.json_backend.available():
+      codec.backend = backend
+      encoded = codec.encode({'name': 'Steve', '__namespace__': 'Buds'})
+      self.assertEquals({'name': 'Steve'}, json.loads(encoded))
 
 
 class TestEncoding(TestCase):
@@ -107,7 +239,8 @@ class TestEncoding(TestCase):
     resp = self.client.post('/echo', data=json.dumps({'hello': 'world'}))
 
     self.assertEquals({'hello': 'world'}, self.last_payload)
-    self.assertEquals('{"hello": "world"}', resp.get_data(as_text=True))
+    self.assertEquals({'hello': 'world'},
+                      json.loads(resp.get_data(as_text=True)))
 
   def test_simple_xml_echo(self):
     resp = self.client.post('/echo',
@@ -166,6 +299,22 @@ class TestEncoding(TestCase):
     self.assertTrue('<motown_philly>too soft</motown_philly>' in xml)
     self.assertTrue('<name>field is required</name>' in xml)
 
+  def test_encoder_is_negotiated_once_per_accept_header(self):
+    with self.app.test_request_context('/', headers=self._accept('text/xml')):
+      codec = rest.encoding.encoder(request)
+      self.assertTrue(isinstance(codec, rest.encoding.XmlEncoding))
+      self.assertTrue(codec is rest.encoding.encoder(request))
+      self.assertTrue(codec is not rest.encoding.encoder(request, 'errors'))
+      self.assertEquals('errors',
+                        rest.encoding.encoder(request, 'errors').namespace)
+
+    with self.app.test_request_context('/', headers=self._accept('text/xml')):
+      self.assertTrue(codec is rest.encoding.encoder(request))
+
+    with self.app.test_request_context('/'):
+      self.assertTrue(isinstance(rest.encoding.encoder(request),
+                                 rest.encoding.JsonEncoding))
+
   def _accept(self, accept):
     headers = Headers()
     headers.add('Accept', accept)
@@ -183,3 +183,30 @@ class FieldTest(TestCase):
     self.assertEquals(error, fields.Email('notld@somewhere').validate())
 
     self.assertEquals([], fields.Email('valid@email.com').validate())
+
+  def test_int_coerce_column(self):
+    values, errors = fields.Int().coerce_column(['4', '', 7, 'four', 4.2])
+    self.assertEquals([4, 0, 7, None, 4], values)
+    self.assertEquals({3: ['Invalid integer']}, errors)
+
+  def test_float_coerce_column(self):
+    values, errors = fields.Float().coerce_column(['4.02', '', 'x', 1])
+    self.assertEquals([4.02, 0.0, None, 1.0], values)
+    self.assertEquals({2: ['Invalid float']}, errors)
+
+  def test_dollars_coerce_column(self):
+    values, errors = fields.Dollars().coerce_column(['1.10', 1.10, '', '$'])
+    self.assertEquals([Decimal('1.10'), Decimal('1.10'), Decimal('0'), None],
+                      values)
+    self.assertEquals({3: ['Invalid decimal']}, errors)
+
+  def test_string_bool_coerce_column(self):
+    values, errors = fields.StringBool().coerce_column(
+      ['True', 'false', True, 'yes'])
+    self.assertEquals([True, False, True, None], values)
+    self.assertEquals({3: ["Value must be 'true' or 'false'"]}, errors)
+
+  def test_coerce_column_falls_back_to_coerce(self):
+    values, errors = fields.String(trim_to=2).coerce_column(['abc', 1])
+    self.assertEquals(['ab', '1'], values)
+    self.assertEquals({}, errors)
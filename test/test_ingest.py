@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+import io
+import tempfile
+from unittest import TestCase
+
+import six
+
+import rest
+from rest import ingest
+
+
+LINES = [b'dog_type,food,pounds\n', b'great dane,cured meats,200\n',
+         b'shibe,doge food,20\n']
+
+
+class UnseekableStream(object):
+  def __init__(self, data):
+    self._data = io.BytesIO(data)
+
+  def read(self, size=-1):
+    return self._data.read(size)
+
+
+class TestUploadFile(TestCase):
+
+  def test_in_memory_upload(self):
+    stream = six.BytesIO(b''.join(LINES))
+    self.assertEquals(LINES, list(ingest.upload_file(stream)))
+
+  def test_upload_on_disk_is_memory_mapped(self):
+    with tempfile.TemporaryFile() as f:
+      f.write(b''.join(LINES))
+      f.seek(len(LINES[0]))
+      self.assertEquals(LINES[1:], list(ingest.upload_file(f)))
+
+  def test_small_spooled_upload_is_not_rolled_over(self):
+    with tempfile.SpooledTemporaryFile(max_size=1024) as f:
+      f.write(b''.join(LINES))
+      f.seek(0)
+      self.assertEquals(LINES, list(ingest.upload_file(f)))
+      self.assertFalse(f._rolled)
+
+  def test_rolled_over_upload_is_memory_mapped(self):
+    with tempfile.SpooledTemporaryFile(max_size=10) as f:
+      f.write(b''.join(LINES))
+      f.seek(0)
+      self.assertTrue(f._rolled)
+      self.assertEquals(LINES, list(ingest.upload_file(f)))
+
+  def test_empty_upload_on_disk(self):
+    with tempfile.TemporaryFile() as f:
+      self.assertEquals([], list(ingest.upload_file(f)))
+
+  def test_small_stream_stays_in_memory(self):
+    stream = UnseekableStream(b''.join(LINES))
+    self.assertEquals(LINES, list(ingest.upload_file(stream)))
+
+  def test_large_stream_is_spooled(self):
+    stream = UnseekableStream(b''.join(LINES))
+    self.assertEquals(LINES, list(ingest.upload_file(stream, threshold=10)))
+
+  def test_closing_leaves_upload_open(self):
+    stream = six.BytesIO(b''.join(LINES))
+    ingest.upload_file(stream).close()
+    self.assertFalse(stream.closed)
+
+  def test_closing_spooled_file(self):
+    stream = UnseekableStream(b''.join(LINES))
+    f = ingest.upload_file(stream, threshold=10)
+    f.close()
+    self.assertTrue(f.closed)
+
+  def test_unterminated_last_line(self):
+    with tempfile.TemporaryFile() as f:
+      f.write(b'a,b\nc,d')
+      f.seek(0)
+      self.assertEquals([b'a,b\n', b'c,d'], list(ingest.upload_file(f)))
+
+
+class TestTextFile(TestCase):
+
+  def test_short_text(self):
+    text = u'Hänsel,pies,1500\nniño,foods,43\n'
+    self.assertEquals([u'Hänsel,pies,1500\n'.encode('utf8'),
+                       u'niño,foods,43\n'.encode('utf8')],
+                      list(ingest.text_file(text)))
+
+  def test_long_text_is_spooled(self):
+    text = u''.join(u'niño %d,foods,%d\n' % (i, i) for i in range(1000))
+    lines = list(ingest.text_file(text, threshold=100))
+    self.assertEquals(1000, len(lines))
+    self.assertEquals(text.encode('utf8'), b''.join(lines))
+
+
+class TestCsvRows(TestCase):
+
+  def test_header(self):
+    fieldnames, rows = ingest.csv_rows(six.BytesIO(b''.join(LINES)))
+    self.assertEquals(('dog_type', 'food', 'pounds'), fieldnames)
+    self.assertEquals([['great dane', 'cured meats', '200'],
+                       ['shibe', 'doge food', '20']], list(rows))
+
+  def test_fieldnames(self):
+    fieldnames, rows = ingest.csv_rows(six.BytesIO(b''.join(LINES[1:])),
+                                       ['a', 'b', 'c'])
+    self.assertEquals(('a', 'b', 'c'), fieldnames)
+    self.assertEquals(2, len(list(rows)))
+
+  def test_empty(self):
+    fieldnames, rows = ingest.csv_rows(six.BytesIO(b''))
+    self.assertEquals((), fieldnames)
+    self.assertEquals([], list(rows))
+
+  def test_skips_blank_lines(self):
+    f = six.BytesIO(b'a,b\n\n1,2\n\n')
+    fieldnames, rows = ingest.csv_rows(f)
+    self.assertEquals([['1', '2']], list(rows))
+
+  def test_decodes_utf8(self):
+    f = six.BytesIO(u'name\nniño\n'.encode('utf8'))
+    fieldnames, rows = ingest.csv_rows(f)
+    self.assertEquals([[u'niño']], list(rows))
+
+  def test_quoted_newlines_from_spooled_file(self):
+    stream = UnseekableStream(b'a,b\n"one\ntwo",3\n')
+    fieldnames, rows = ingest.csv_rows(ingest.upload_file(stream, threshold=4))
+    self.assertEquals([['one\ntwo', '3']], list(rows))
+
+
+class TestOverriddenCall(TestCase):
+  def setUp(self):
+    class TrimmingSchema(rest.Schema):
+      dog_type = rest.String(validators=[rest.nonempty])
+      pounds   = rest.Int()
+
+      def __call__(self, data=None):
+        data = dict((k, v.strip()) for k, v in data.items() if v)
+        return super(TrimmingSchema, self).__call__(data)
+
+    self.schema = TrimmingSchema
+    self.fieldnames = ('dog_type', 'pounds')
+
+  def test_called_with_a_dict(self):
+    rows = [[' shibe ', '20'], ['dane']]
+    schemas = list(ingest.validate_rows(self.schema, rows, self.fieldnames))
+    self.assertEquals(['shibe', 'dane'],
+                      [schema.dog_type.get() for schema in schemas])
+
+  def test_invalid_row_of_a_batch_called_with_a_dict(self):
+    rows = [['shibe', '20'], ['', '10']]
+    batches = ingest.validate_batches(self.schema, rows, 2,
+                                      fieldnames=self.fieldnames)
+    self.assertEquals([{'dog_type': 'shibe', 'pounds': 20}], next(batches))
+    with self.assertRaises(ingest.CsvValidationError) as cm:
+      next(batches)
+    self.assertEquals({'dog_type': ['cannot be empty']},
+                      cm.exception.schema._errors)
+
+
+class TestValidateBatches(TestCase):
+  def setUp(self):
+    class DogSchema(rest.Schema):
+      dog_type = rest.String(validators=[rest.nonempty])
+      pounds   = rest.Int()
+
+    self.schema = DogSchema
+    self.fieldnames = ('dog_type', 'pounds')
+
+  def batches(self, rows, size, **kwargs):
+    return list(ingest.validate_batches(self.schema, rows, size,
+      fieldnames=self.fieldnames, **kwargs))
+
+  def test_batches(self):
+    rows = [['dog %d' % i, str(i)] for i in range(5)]
+    self.assertEquals([
+      [{'dog_type': 'dog 0', 'pounds': 0}, {'dog_type': 'dog 1', 'pounds': 1}],
+      [{'dog_type': 'dog 2', 'pounds': 2}, {'dog_type': 'dog 3', 'pounds': 3}],
+      [{'dog_type': 'dog 4', 'pounds': 4}],
+    ], self.batches(rows, 2))
+
+  def test_columns(self):
+    rows = [['dog %d' % i, str(i)] for i in range(3)]
+    self.assertEquals([
+      {'dog_type': ['dog 0', 'dog 1'], 'pounds': [0, 1]},
+      {'dog_type': ['dog 2'], 'pounds': [2]},
+    ], self.batches(rows, 2, as_columns=True))
+
+  def test_dict_rows(self):
+    rows = [{'dog_type': 'shibe', 'pounds': '20'}]
+    self.assertEquals([[{'dog_type': 'shibe', 'pounds': 20}]],
+      list(ingest.validate_batches(self.schema, rows, 10)))
+
+  def test_valid_rows_before_an_invalid_one(self):
+    rows = [['shibe', '20'], ['dane', '200'], ['', '10'], ['pug', '8']]
+    batches = ingest.validate_batches(self.schema, iter(rows), 3,
+                                      fieldnames=self.fieldnames)
+    self.assertEquals([{'dog_type': 'shibe', 'pounds': 20},
+                       {'dog_type': 'dane', 'pounds': 200}], next(batches))
+    with self.assertRaises(ingest.CsvValidationError) as cm:
+      next(batches)
+    self.assertIn('dog_type', cm.exception.schema._errors)
+
+  def test_invalid_first_row_of_a_batch(self):
+    rows = [['shibe', '20'], ['', '10']]
+    batches = ingest.validate_batches(self.schema, rows, 1,
+                                      fieldnames=self.fieldnames)
+    self.assertEquals([{'dog_type': 'shibe', 'pounds': 20}], next(batches))
+    self.assertRaises(ingest.CsvValidationError, next, batches)
+
+  def test_row_failing_only_as_a_batch(self):
+    class BatchOnlySchema(self.schema):
+      @classmethod
+      def validate_many(cls, rows, start=0, fieldnames=None):
+        result = super(BatchOnlySchema, cls).validate_many(rows, start,
+                                                           fieldnames)
+        result.errors[start + 1] = {'dog_type': ['duplicate']}
+        result.valid.remove(start + 1)
+        return result
+
+    rows = [['shibe', '20'], ['dane', '200'], ['pug', '8']]
+    batches = ingest.validate_batches(BatchOnlySchema, rows, 3,
+                                      fieldnames=self.fieldnames)
+    self.assertEquals([{'dog_type': 'shibe', 'pounds': 20}], next(batches))
+    with self.assertRaises(ingest.CsvValidationError) as cm:
+      next(batches)
+    self.assertEquals({'dog_type': ['duplicate']}, cm.exception.schema._errors)
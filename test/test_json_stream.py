@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from json import dumps
+from unittest import TestCase
+
+import six
+
+from rest.json_stream import JsonStreamError
+from rest.json_stream import stream_member
+
+
+def decode(body, chunk_size=3):
+  data, pieces = stream_member(six.BytesIO(body), 'csv', chunk_size)
+  if pieces is None:
+    return data, None
+  return data, u''.join(pieces)
+
+
+class TestStreamMember(TestCase):
+
+  def test_member_between_others(self):
+    body = dumps({'a': 1, 'csv': u'niño,pies\n"x, y",2\n', 'z': [1.5, None]},
+                 sort_keys=True).encode('utf8')
+    self.assertEquals(({'a': 1, 'z': [1.5, None]}, u'niño,pies\n"x, y",2\n'),
+                      decode(body))
+
+  def test_members_after_arrive_once_read(self):
+    body = b'{"before": "b", "csv": "a,b\\nc,d", "after": 12345}'
+    data, pieces = stream_member(six.BytesIO(body), 'csv', 4)
+    self.assertEquals({'before': 'b'}, data)
+    self.assertEquals(u'a,b\nc,d', u''.join(pieces))
+    self.assertEquals({'before': 'b', 'after': 12345}, data)
+
+  def test_escapes_split_across_chunks(self):
+    text = u'\\ "quoted" é\U0001F600\t/\x01'
+    for ensure_ascii in (True, False):
+      body = dumps({'csv': text}, ensure_ascii=ensure_ascii).encode('utf8')
+      for chunk_size in range(1, 8):
+        self.assertEquals(({}, text), decode(body, chunk_size))
+
+  def test_numbers_split_across_chunks(self):
+    body = (b'{"a": 1.5, "b": -20, "c": 3e10, "d": -0.25E-3, "e": [10, 2.0],'
+            b' "csv": "x", "f": 123456789, "g": 7.125e+2}')
+    expected = {'a': 1.5, 'b': -20, 'c': 3e10, 'd': -0.25E-3, 'e': [10, 2.0],
+                'f': 123456789, 'g': 7.125e+2}
+    for chunk_size in range(1, len(body) + 1):
+      self.assertEquals((expected, u'x'), decode(body, chunk_size),
+                        chunk_size)
+
+  def test_pieces_are_bounded_by_chunks(self):
+    body = dumps({'csv': u'x' * 1000}).encode('utf8')
+    data, pieces = stream_member(six.BytesIO(body), 'csv', 100)
+    self.assertTrue(all(len(piece) <= 100 for piece in pieces))
+
+  def test_missing_member(self):
+    self.assertEquals(({'a': 1}, None), decode(b'{"a": 1}'))
+
+  def test_member_which_isnt_a_string(self):
+    self.assertEquals(({'csv': None}, None), decode(b'{"csv": null}'))
+
+  def test_empty_body(self):
+    self.assertEquals(({}, None), decode(b''))
+    self.assertEquals(({}, None), decode(b'{}'))
+
+  def test_malformed(self):
+    for body in [b'[1]', b'{"a" 1}', b'{"a": 1,}', b'{"a": 1} x',
+                 b'{"csv": "abc', b'{"csv": "\\q0123456789abc"}',
+                 b'{"csv": "a"', b'{"csv": "a"} x']:
+      with self.assertRaises(JsonStreamError):
+        decode(body)
@@ -0,0 +1,26 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from rest.limits import JsonDepth
+from rest.limits import LimitExceeded
+
+
+class TestJsonDepth(TestCase):
+
+  def feed(self, body, max_depth, chunk_size=1):
+    depth = JsonDepth(max_depth)
+    for i in range(0, len(body), chunk_size):
+      depth.feed(body[i:i + chunk_size])
+    return depth
+
+  def test_counts_nesting(self):
+    self.assertEquals(0, self.feed(b'{"a": [1, {"b": []}]}', 4).depth)
+
+  def test_too_deep(self):
+    with self.assertRaises(LimitExceeded):
+      self.feed(b'{"a": [1, {"b": []}]}', 3)
+
+  def test_ignores_brackets_in_strings(self):
+    for chunk_size in (1, 2, 3, 100):
+      self.feed(b'{"a": "[[[{{\\\\", "b\\"[[[": "\\"{{{"}', 1, chunk_size)
+
@@ -1,16 +1,22 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import
 
+from concurrent.futures.process import BrokenProcessPool
+import flask
 from flask import Flask
 from flask_testing import TestCase
 from json import dumps
 from json import loads
 from nose.plugins.skip import SkipTest
+import os
+import tracemalloc
 
 import rest
 
 from test import ViewTestCase
+from test.test_compression import decompress
 
+from rest import ingest
 from rest.schema import Schema
 import six
 
@@ -18,8 +24,84 @@ import six
 class TestRest(ViewTestCase):
 
   def test_simple_serialize(self):
-    self.assertEquals('{"simple": "json"}', rest._serialize({'simple': 'json'}))
-    self.assertEquals('["a list", 1]', rest._serialize(["a list", 1]))
+    self.assertEquals({'simple': 'json'},
+                      loads(rest._serialize({'simple': 'json'})))
+    self.assertEquals(['a list', 1], loads(rest._serialize(["a list", 1])))
+
+
+class TestStreaming(TestCase):
+  def setUp(self):
+    self.pulled = 0
+
+    class DogSchema(Schema):
+      name   = rest.String()
+      pounds = rest.Int()
+
+    def dogs(count):
+      for i in range(count):
+        self.pulled += 1
+        yield DogSchema(name='dog-%d' % i, pounds=i)
+
+    @self.app.route('/dogs/<int:count>')
+    @rest.view(stream=True)
+    def streamed_dogs(count):
+      return dogs(count)
+
+    @self.app.route('/buffered_dogs/<int:count>')
+    @rest.view
+    def buffered_dogs(count):
+      return dogs(count)
+
+  def create_app(self):
+    self.app = Flask('TestStreaming')
+    return self.app
+
+  def test_streamed_list_matches_buffered_list(self):
+    streamed = self.client.get('/dogs/500')
+    buffered = self.client.get('/buffered_dogs/500')
+    self.assert200(streamed)
+    self.assertEquals(buffered.get_data(as_text=True),
+                      streamed.get_data(as_text=True))
+    self.assertEquals(500, len(loads(streamed.get_data(as_text=True))))
+
+  def test_streamed_xml_matches_buffered_xml(self):
+    headers = {'Accept': 'text/xml'}
+    streamed = self.client.get('/dogs/500', headers=headers)
+    buffered = self.client.get('/buffered_dogs/500', headers=headers)
+    self.assert200(streamed)
+    self.assertEquals(buffered.get_data(), streamed.get_data())
+    self.assertTrue(streamed.get_data().endswith(b'</Dog></items>'))
+
+  def test_streamed_empty_list(self):
+    resp = self.client.get('/dogs/0')
+    self.assertEquals('[]', resp.get_data(as_text=True))
+
+  def test_stream_pulls_items_lazily(self):
+    with self.app.test_request_context('/dogs/10000'):
+      resp = self.app.view_functions['streamed_dogs'](count=10000)
+      chunks = iter(resp.response)
+      first = next(chunks)
+
+      self.assertTrue(first.startswith('['))
+      self.assertTrue(0 < self.pulled < 10000,
+        'pulled %d items for the first chunk' % self.pulled)
+
+      rest_of_body = ''.join(chunks)
+      self.assertEquals(10000, self.pulled)
+      self.assertEquals(10000, len(loads(first + rest_of_body)))
+
+  def test_stream_peak_memory_is_bounded(self):
+    with self.app.test_request_context('/dogs/50000'):
+      tracemalloc.start()
+      try:
+        resp = self.app.view_functions['streamed_dogs'](count=50000)
+        size = sum(len(chunk) for chunk in resp.response)
+        _, peak = tracemalloc.get_traced_memory()
+      finally:
+        tracemalloc.stop()
+
+    self.assertTrue(peak < size / 10,
+      'peak of %d bytes streaming %d bytes' % (peak, size))
 
 
 class TestSimpleApp(TestCase):
@@ -55,20 +137,296 @@ class TestSimpleApp(TestCase):
     }, body)
 
 
+class TestLimits(TestCase):
+  def setUp(self):
+    limits = rest.Limits(max_bytes=200, max_xml_depth=3, max_xml_elements=6,
+                         max_json_depth=3)
+
+    @self.app.route('/limited', methods=['POST'])
+    @rest.view(limits=limits)
+    def limited(data):
+      return dict(data)
+
+  def create_app(self):
+    self.app = Flask('TestLimits')
+    return self.app
+
+  def post(self, body, **kwargs):
+    return self.client.post('/limited', data=body, **kwargs)
+
+  def assert413(self, resp, message):
+    self.assert_status(resp, 413)
+    self.assertIn(message, resp.get_data(as_text=True))
+
+  def test_within_limits(self):
+    resp = self.post(dumps({'a': {'b': [1, 2]}, 'c': '[[[[{{'}))
+    self.assert200(resp)
+    self.assertEquals({'a': {'b': [1, 2]}, 'c': '[[[[{{'},
+                      loads(resp.get_data(as_text=True)))
+
+  def test_body_too_large(self):
+    self.assert413(self.post(dumps({'a': 'x' * 300})),
+                   'request body is larger than 200 bytes')
+
+  def test_json_too_deep(self):
+    self.assert413(self.post('{"a": [[{"b": 1}]]}'),
+                   'JSON is nested deeper than 3 levels')
+
+  def test_xml_within_limits(self):
+    resp = self.post('<body><a><b>1</b></a><c>2</c></body>',
+                     headers={'accept': 'text/xml'})
+    self.assert200(resp)
+
+  def test_xml_too_deep(self):
+    self.assert413(self.post('<body><a><b><c>1</c></b></a></body>',
+                             headers={'accept': 'text/xml'}),
+                   'XML is nested deeper than 3 elements')
+
+  def test_xml_too_many_elements(self):
+    self.assert413(self.post('<body>%s</body>' % ('<a>1</a>' * 6),
+                             headers={'accept': 'text/xml'}),
+                   'XML has more than 6 elements')
+
+  def test_form_too_large(self):
+    self.assert413(self.post({'a': 'x' * 300}),
+                   'request body is larger than 200 bytes')
+
+  def test_body_read_before_the_view(self):
+    @self.app.before_request
+    def log_body():
+      flask.request.get_data()
+
+    resp = self.post(dumps({'a': 1}))
+    self.assert200(resp)
+    self.assertEquals({'a': 1}, loads(resp.get_data(as_text=True)))
+
+    resp = self.post('<body><a>1</a></body>', headers={'accept': 'text/xml'})
+    self.assert200(resp)
+    self.assertIn(b'<a>1</a>', resp.data)
+
+    self.assert413(self.post(dumps({'a': [[[1]]]})),
+                   'JSON is nested deeper than 3 levels')
+    self.assert413(self.post(dumps({'a': 'x' * 300})),
+                   'request body is larger than 200 bytes')
+
+
+class TestConditional(TestCase):
+  def setUp(self):
+    self.calls = 0
+    self.version = 1
+    self.cache = rest.ResponseCache(ttl=None)
+
+    def dogs():
+      self.calls += 1
+      return [{'name': 'shibe', 'version': self.version}]
+
+    @self.app.route('/tagged')
+    @rest.view(etag=True)
+    def tagged():
+      return dogs()
+
+    @self.app.route('/versioned')
+    @rest.view(etag=lambda: self.version)
+    def versioned():
+      return dogs()
+
+    @self.app.route('/cached')
+    @rest.view(cache=self.cache)
+    def cached():
+      return dogs()
+
+    @self.app.route('/versioned_cache')
+    @rest.view(etag=lambda: self.version, cache=self.cache)
+    def versioned_cache():
+      return dogs()
+
+  def create_app(self):
+    self.app = Flask('TestConditional')
+    return self.app
+
+  def get(self, path, tag=None, **headers):
+    if tag is not None:
+      headers['If-None-Match'] = '"%s"' % tag
+    return self.client.get(path, headers=headers)
+
+  def test_etag_from_body(self):
+    resp = self.get('/tagged')
+    self.assert200(resp)
+    tag, weak = resp.get_etag()
+    self.assertTrue(tag)
+
+    resp = self.get('/tagged', tag)
+    self.assert_status(resp, 304)
+    self.assertEquals(b'', resp.data)
+    self.assertEquals(2, self.calls)
+
+    self.version = 2
+    self.assert200(self.get('/tagged', tag))
+
+  def test_etag_from_version_skips_the_view(self):
+    resp = self.get('/versioned')
+    tag, weak = resp.get_etag()
+
+    self.assert_status(self.get('/versioned', tag), 304)
+    self.assertEquals(1, self.calls)
+
+    self.version = 2
+    resp = self.get('/versioned', tag)
+    self.assert200(resp)
+    self.assertNotEquals(tag, resp.get_etag()[0])
+
+  def test_etag_depends_on_codec(self):
+    json_tag = self.get('/versioned').get_etag()[0]
+    xml_tag = self.get('/versioned', accept='text/xml').get_etag()[0]
+    self.assertNotEquals(json_tag, xml_tag)
+
+  def test_cached_response(self):
+    first = self.get('/cached')
+    second = self.get('/cached')
+    self.assertEquals(first.data, second.data)
+    self.assertEquals(first.get_etag(), second.get_etag())
+    self.assertEquals(1, self.calls)
+
+    self.assert_status(self.get('/cached', first.get_etag()[0]), 304)
+    self.get('/cached?page=2')
+    self.get('/cached', accept='text/xml')
+    self.assertEquals(3, self.calls)
+
+  def test_cache_keyed_on_version(self):
+    self.get('/versioned_cache')
+    self.get('/versioned_cache')
+    self.assertEquals(1, self.calls)
+    self.version = 2
+    resp = self.get('/versioned_cache')
+    self.assertEquals(2, loads(resp.get_data(as_text=True))[0]['version'])
+    self.assertEquals(2, self.calls)
+
+
+class TestCompressedResponses(TestCase):
+  def setUp(self):
+    self.calls = 0
+    self.cache = rest.ResponseCache(ttl=None)
+    self.dogs = [{'name': 'dog %d' % i, 'food': 'kibble'} for i in range(200)]
+
+    def dogs():
+      self.calls += 1
+      return self.dogs
+
+    @self.app.route('/big')
+    @rest.view(compress=True)
+    def big():
+      return dogs()
+
+    @self.app.route('/small')
+    @rest.view(compress=True)
+    def small():
+      return {'name': 'shibe'}
+
+    @self.app.route('/streamed')
+    @rest.view(stream=True, compress=True)
+    def streamed():
+      return iter(dogs())
+
+    @self.app.route('/cached')
+    @rest.view(cache=self.cache, compress=True)
+    def cached():
+      return dogs()
+
+    @self.app.route('/error')
+    @rest.view(compress=100)
+    def error():
+      return rest.error({'client': ['bad dog'] * 20})
+
+  def create_app(self):
+    self.app = Flask('TestCompressedResponses')
+    return self.app
+
+  def get(self, path, encoding='gzip', **headers):
+    headers['Accept-Encoding'] = encoding
+    return self.client.get(path, headers=headers)
+
+  def body(self, resp):
+    return loads(decompress(resp.data, resp.headers['Content-Encoding']))
+
+  def test_compressed(self):
+    resp = self.get('/big')
+    self.assert200(resp)
+    self.assertEquals('gzip', resp.headers['Content-Encoding'])
+    self.assertIn('Accept-Encoding', resp.headers['Vary'])
+    self.assertEquals(self.dogs, self.body(resp))
+
+  def test_not_accepted(self):
+    resp = self.get('/big', encoding='identity')
+    self.assertNotIn('Content-Encoding', resp.headers)
+    self.assertIn('Accept-Encoding', resp.headers['Vary'])
+    self.assertEquals(self.dogs, loads(resp.get_data(as_text=True)))
+
+  def test_small_bodies_left_alone(self):
+    resp = self.get('/small')
+    self.assertNotIn('Content-Encoding', resp.headers)
+    self.assertEquals({'name': 'shibe'}, loads(resp.get_data(as_text=True)))
+
+  def test_streamed(self):
+    resp = self.get('/streamed', encoding='deflate')
+    self.assertEquals('deflate', resp.headers['Content-Encoding'])
+    self.assertEquals(self.dogs, self.body(resp))
+
+  def test_error_responses(self):
+    resp = self.get('/error')
+    self.assert400(resp)
+    self.assertEquals({'client': ['bad dog'] * 20}, self.body(resp))
+
+  def test_cached_bytes_compressed_once(self):
+    first = self.get('/cached')
+    second = self.get('/cached')
+    self.assertEquals(1, self.calls)
+    self.assertEquals(first.data, second.data)
+    self.assertEquals(self.dogs, self.body(second))
+
+    (tag, body, compressed), = [self.cache.get(key)
+                                for key in list(self.cache._data)]
+    self.assertEquals(['gzip'], list(compressed))
+    self.assertEquals(first.data, compressed['gzip'])
+
+    plain = self.get('/cached', encoding='identity')
+    self.assertEquals(body, plain.data)
+    self.assertNotEquals(first.get_etag(), plain.get_etag())
+
+  def test_compressed_etag_not_modified(self):
+    tag, weak = self.get('/cached').get_etag()
+    resp = self.get('/cached', **{'If-None-Match': '"%s"' % tag})
+    self.assert_status(resp, 304)
+
+
+# module level, so pool workers can import them
+class CSVSchema(Schema):
+  dog_type = rest.String(validators=[rest.nonempty])
+  food     = rest.String(validators=[rest.nonempty])
+  pounds   = rest.Int()
+
+
+class NameSchema(Schema):
+  name = rest.String(validators=[rest.nonempty])
+
+
+class FatalSchema(Schema):
+  name = rest.String()
+
+  def validate_name(self, value):
+    if value == 'fatal':
+      os._exit(1)
+
+
 class TestCSVUpload(TestCase):
   def setUp(self):
     self.seen_dog_names = []
+    self.seen_pounds = []
+    self.seen_batches = []
 
     self.csv_headers = {
       'content-type': 'multipart/form-data'
     }
 
-    class CSVSchema(Schema):
-      dog_type = rest.String(validators=[rest.nonempty])
-      food     = rest.String(validators=[rest.nonempty])
-      pounds   = rest.Int()
-
-
     @self.app.route('/csv', methods=['POST'])
     @rest.csv_upload(CSVSchema)
     def csv(rows):
@@ -76,6 +434,35 @@ class TestCSVUpload(TestCase):
         self.seen_dog_names.append(schema.dog_type.get())
       return rest.created({'csv': 'created'})
 
+    @self.app.route('/csv_parallel', methods=['POST'])
+    @rest.csv_upload(CSVSchema, parallel=2, parallel_threshold=2)
+    def csv_parallel(rows):
+      for schema in rows:
+        self.seen_dog_names.append(schema.dog_type.get())
+        self.seen_pounds.append(schema.pounds.get())
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_all_errors', methods=['POST'])
+    @rest.csv_upload(CSVSchema, collect_errors=True, max_errors=2)
+    def csv_all_errors(rows):
+      for schema in rows:
+        self.seen_dog_names.append(schema.dog_type.get())
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_batches', methods=['POST'])
+    @rest.csv_upload(CSVSchema, batch_size=2)
+    def csv_batches(rows):
+      for batch in rows:
+        self.seen_batches.append(batch)
+      return rest.created({'csv': 'created'})
+
+    @self.app.route('/csv_columns', methods=['POST'])
+    @rest.csv_upload(CSVSchema, batch_size=2, as_columns=True)
+    def csv_columns(rows):
+      for batch in rows:
+        self.seen_batches.append(batch)
+      return rest.created({'csv': 'created'})
+
     @self.app.route('/csv_with_fieldnames', methods=['POST'])
     @rest.csv_upload(CSVSchema, fieldnames=('dog_type','food','pounds',))
     def csv_with_fieldnames(rows):
@@ -100,6 +487,12 @@ class TestCSVUpload(TestCase):
       else:
         return rest.created(response)
 
+    @self.app.route('/csv_json_stream', methods=['POST'])
+    @rest.json_csv_upload(('dog_type','food','pounds',), stream=True)
+    def csv_json_stream(rows, data):
+      response = [row for row, row_number, errors in rows]
+      return rest.created({'rows': response, 'data': data})
+
   def create_app(self):
     self.app = Flask('TestCSVUpload')
     return self.app
@@ -183,6 +576,193 @@ class TestCSVUpload(TestCase):
     for name in self.seen_dog_names:
       self.assertIn(name, expected_dog_names)
 
+  def test_csv_upload_in_batches(self):
+    data = "dog_type,food,pounds\n" \
+      "great dane,cured meats,200\n" \
+      "cerberus,souls,1500\n" \
+      "shibe,doge food,20\n"
+
+    resp = self.client.post('/csv_batches', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert_status(resp, 201)
+    self.assertEqual([
+      [{'dog_type': 'great dane', 'food': 'cured meats', 'pounds': 200},
+       {'dog_type': 'cerberus', 'food': 'souls', 'pounds': 1500}],
+      [{'dog_type': 'shibe', 'food': 'doge food', 'pounds': 20}],
+    ], self.seen_batches)
+
+  def test_csv_upload_in_columns(self):
+    data = "dog_type,food,pounds\n" \
+      "great dane,cured meats,200\n" \
+      "cerberus,souls,1500\n" \
+      "shibe,doge food,20\n"
+
+    resp = self.client.post('/csv_columns', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert_status(resp, 201)
+    self.assertEqual([
+      {'dog_type': ['great dane', 'cerberus'],
+       'food': ['cured meats', 'souls'],
+       'pounds': [200, 1500]},
+      {'dog_type': ['shibe'], 'food': ['doge food'], 'pounds': [20]},
+    ], self.seen_batches)
+
+  def test_csv_upload_in_batches_with_invalid_row(self):
+    data = "dog_type,food,pounds\n" \
+      "great dane,cured meats,200\n" \
+      "cerberus,souls,1500\n" \
+      "shibe,,20\n"
+
+    resp = self.client.post('/csv_batches', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert400(resp)
+    self.assertIn('food', loads(resp.get_data(as_text=True)))
+    self.assertEqual(1, len(self.seen_batches))
+
+  def test_csv_upload_batches_options(self):
+    self.assertRaises(ValueError, rest.csv_upload, Schema, batch_size=10,
+                      parallel=2)
+    self.assertRaises(ValueError, rest.csv_upload, Schema, as_columns=True)
+
+  def test_parallel_csv_upload(self):
+    data = "dog_type,food,pounds\n" + "".join(
+      "dog %d,kibble,%d\n" % (i, i) for i in range(5000))
+
+    resp = self.client.post('/csv_parallel', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert_status(resp, 201)
+    self.assertEquals(['dog %d' % i for i in range(5000)], self.seen_dog_names)
+    self.assertEquals(list(range(5000)), self.seen_pounds)
+
+  def test_parallel_csv_upload_stops_at_first_invalid_row(self):
+    lines = ["dog %d,kibble,%d\n" % (i, i) for i in range(5000)]
+    lines[3000] = "dog 3000,,3000\n"
+    lines[4000] = "dog 4000,kibble,heavy\n"
+    data = "dog_type,food,pounds\n" + "".join(lines)
+
+    resp = self.client.post('/csv_parallel', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert400(resp)
+    self.assertEquals({'food': ['cannot be empty']},
+                      loads(resp.get_data(as_text=True)))
+    self.assertEquals(['dog %d' % i for i in range(3000)], self.seen_dog_names)
+
+  def test_parallel_rows_below_threshold_run_in_process(self):
+    class TinySchema(Schema):
+      name = rest.String(validators=[rest.nonempty])
+
+    rows = rest.parallel_rows(TinySchema, [{'name': 'a'}, {'name': 'b'}], 2,
+                              threshold=10)
+    self.assertEquals(['a', 'b'], [schema.name.get() for schema in rows])
+
+  def test_csv_upload_collecting_all_errors(self):
+    data = "dog_type,food,pounds\n" \
+      "great dane,cured meats,200\n" \
+      "cerberus,,1500\n" \
+      "shibe,doge food,twenty\n" \
+      ",kibble,65\n"
+
+    resp = self.client.post('/csv_all_errors', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert400(resp)
+    self.assertEquals([], self.seen_dog_names)
+    self.assertEquals({
+      'rows': [
+        {'row': 2, 'errors': {'food': ['cannot be empty']}},
+        {'row': 3, 'errors': {'pounds': ['Invalid integer']}},
+      ],
+      'error_count': 3,
+      'truncated':   True,
+    }, loads(resp.get_data(as_text=True)))
+
+  def test_csv_upload_collecting_all_errors_as_xml(self):
+    data = "dog_type,food,pounds\n" \
+      ",cured meats,200\n" \
+      "cerberus,,1500\n"
+
+    headers = dict(self.csv_headers, Accept='text/xml')
+    resp = self.client.post('/csv_all_errors', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=headers)
+
+    self.assert400(resp)
+    self.assertIn(b'<rows><row>1</row><errors>'
+                  b'<dog_type>cannot be empty</dog_type></errors></rows>'
+                  b'<rows><row>2</row><errors>'
+                  b'<food>cannot be empty</food></errors></rows>'
+                  b'<error_count>2</error_count>'
+                  b'<truncated>false</truncated>', resp.data)
+
+  def test_collect_csv_errors_keeps_no_rows(self):
+    class TinySchema(Schema):
+      name   = rest.String(validators=[rest.nonempty])
+      pounds = rest.Int()
+
+    # the reason csv_upload reads the file twice rather than keeping the
+    # schemas validated the first time
+    rows = (['dog %d' % i, str(i)] for i in range(50000))
+    tracemalloc.start()
+    try:
+      report = rest.collect_csv_errors(TinySchema, rows,
+                                       fieldnames=('name', 'pounds'))
+      peak = tracemalloc.get_traced_memory()[1]
+    finally:
+      tracemalloc.stop()
+    self.assertFalse(report)
+    self.assertTrue(peak < 4 * 1024 * 1024, peak)
+
+  def test_csv_upload_collecting_all_errors_with_valid_data(self):
+    data = "dog_type,food,pounds\n" \
+      "great dane,cured meats,200\n" \
+      "shibe,doge food,20\n"
+
+    resp = self.client.post('/csv_all_errors', data={
+      'file': (six.BytesIO(data.encode()), 'test.csv')}, headers=self.csv_headers)
+
+    self.assert_status(resp, 201)
+    self.assertEquals(['great dane', 'shibe'], self.seen_dog_names)
+
+  def test_collect_csv_errors_across_processes(self):
+    rows = [{'name': ''} if i % 1000 == 7 else {'name': 'x'}
+            for i in range(10000)]
+    report = rest.collect_csv_errors(NameSchema, rows, max_errors=3,
+                                     workers=2, threshold=100)
+    self.assertEquals(10, report.error_count)
+    self.assertEquals([8, 1008, 2008], sorted(report.rows))
+
+  def test_pool_shared_between_uploads(self):
+    rows = [{'name': 'x'}] * 5000
+    self.assertEquals(0, rest.collect_csv_errors(NameSchema, rows,
+      workers=2, threshold=100).error_count)
+    pool = ingest._pool(2)
+    self.assertEquals(5000, len(list(rest.parallel_rows(NameSchema, rows, 2,
+                                                        threshold=100))))
+    self.assertTrue(pool is ingest._pool(2))
+    self.assertEquals(ingest.START_METHOD,
+                      pool._mp_context.get_start_method())
+    self.assertNotEquals('fork', ingest.START_METHOD)
+
+  def test_broken_pool_replaced(self):
+    rows = [{'name': 'x'}] * 500 + [{'name': 'fatal'}]
+    self.assertRaises(BrokenProcessPool, rest.collect_csv_errors,
+                      FatalSchema, rows, workers=3, threshold=100)
+    self.assertEquals(0, rest.collect_csv_errors(FatalSchema, rows[:500],
+      workers=3, threshold=100).error_count)
+
+  def test_unimportable_schema_validated_in_process(self):
+    class LocalSchema(Schema):
+      name = rest.String(validators=[rest.nonempty])
+
+    rows = [{'name': 'x'}] * 200 + [{'name': ''}]
+    report = rest.collect_csv_errors(LocalSchema, rows, workers=2,
+                                     threshold=100)
+    self.assertEquals([201], sorted(report.rows))
+
   def test_csv_upload_with_unicode_body(self):
     """
     it should be able to handle unicode characters
@@ -248,6 +828,39 @@ class TestCSVUpload(TestCase):
     self.assertIn(u'niño', names)
     self.assertIn(u'foxes', names)
 
+  def test_streamed_json_csv_upload(self):
+    o = {
+      'before': 1,
+      'csv':    u"foxes,cured meats,3200\n"
+                u"H\u00e4nsel,pies,1500\n"
+                u"\"ni\u00f1o, jr\",foods,43\n",
+      'zafter': [2],
+    }
+
+    resp = self.client.post('/csv_json_stream', data=dumps(o, sort_keys=True),
+        headers={'content-type': 'application/json'})
+    self.assert_status(resp, 201)
+
+    body = loads(resp.get_data(as_text=True))
+    self.assertEquals({'before': 1, 'zafter': [2]}, body['data'])
+    self.assertEquals([u'foxes', u'Hänsel', u'niño, jr'],
+                      [row['dog_type'] for row in body['rows']])
+    self.assertEquals(u'1500', body['rows'][1]['pounds'])
+
+  def test_streamed_json_csv_upload_without_csv(self):
+    for o in [{'csv': ''}, {'not_csv': 'a,b,c'}, {'csv': None}]:
+      resp = self.client.post('/csv_json_stream', data=dumps(o),
+          headers={'content-type': 'application/json'})
+      self.assert400(resp)
+      body = loads(resp.get_data(as_text=True))
+      self.assertIn('"csv" key cannot be empty', body['client'])
+
+  def test_streamed_json_csv_upload_malformed(self):
+    for data in ['{"csv": "a,b,c\n', '{"csv": "a,b,c\n"} trailing']:
+      resp = self.client.post('/csv_json_stream', data=data,
+          headers={'content-type': 'application/json'})
+      self.assert400(resp)
+
   def test_json_csv_with_defined_fieldnames(self):
     """
     it should use the given fieldnames in making dicts for the schema
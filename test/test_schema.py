@@ -1,6 +1,8 @@
 from __future__ import absolute_import
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from unittest import TestCase
+import time
 
 import rest
 
@@ -140,6 +142,64 @@ class TestSchema(TestCase):
                        '__namespace__': 'Person'},
                       schema._get())
 
+  def test_get_without_namespace(self):
+    schema = FriendSchema(name='Bob')
+    self.assertEquals({'name': 'Bob', 'age': None},
+                      schema._get(namespace=False))
+
+  def test_get_is_cached_until_a_field_changes(self):
+    class CountingString(rest.String):
+      simplified = 0
+
+      def simplify(self, value):
+        CountingString.simplified += 1
+        return value
+
+    class PetSchema(rest.Schema):
+      name = CountingString()
+      age  = rest.Int()
+
+    schema = PetSchema(name='Rex')
+    self.assertEquals('Rex', schema._get()['name'])
+    self.assertEquals('Rex', schema._get()['name'])
+    self.assertEquals(1, CountingString.simplified)
+
+    schema({'name': 'Fido'})
+    self.assertEquals('Fido', schema._get()['name'])
+    schema({'age': '3'})
+    self.assertEquals({'name': 'Fido', 'age': 3},
+                      schema._get(namespace=False))
+    self.assertEquals(2, CountingString.simplified)
+
+    schema.name.reset()
+    self.assertEquals(None, schema._get()['name'])
+
+  def test_get_returns_a_copy(self):
+    schema = FriendSchema(name='Bob')
+    schema._get()['name'] = 'Alice'
+    self.assertEquals('Bob', schema._get()['name'])
+
+  def test_get_follows_delegated_values(self):
+    class Box(object):
+      value = 'Rex'
+
+      def get(self):
+        return self.value
+
+      def set(self, value):
+        self.value = value
+
+    box = Box()
+
+    class PetSchema(rest.Schema):
+      name = rest.String(box)
+
+    schema = PetSchema()
+    schema.name.set('Rex')
+    self.assertEquals('Rex', schema._get()['name'])
+    box.value = 'Fido'
+    self.assertEquals('Fido', schema._get()['name'])
+
   def test_implied_name(self):
     class PantsSchema(rest.Schema):
       pass
@@ -149,3 +209,140 @@ class TestSchema(TestCase):
     class PantsSchema(rest.Schema):
       __namespace__ = 'Shorts'
     self.assertEquals('Shorts', PantsSchema().get_namespace())
+
+  def test_field_table_compiled_per_class(self):
+    class TableSchema(rest.Schema):
+      b_field = rest.String()
+      a_field = rest.Int()
+      hidden  = rest.WriteOnly(rest.String())
+
+      def validate_a_field(self, value):
+        if value == 13:
+          raise ValueError('unlucky')
+
+    self.assertEquals(('a_field', 'b_field', 'hidden'),
+                      tuple(name for name, _ in TableSchema._field_table))
+    self.assertEquals(('a_field', 'b_field'),
+                      tuple(name for name, _ in
+                        TableSchema._serialization_plan))
+
+    schema = TableSchema()
+    self.assertFalse(schema({'a_field': '13'}))
+    self.assertEquals(['unlucky'], schema._errors['a_field'])
+    self.assertTrue(schema({'a_field': '12'}))
+
+  def test_static_and_class_method_hooks(self):
+    class HookSchema(rest.Schema):
+      n = rest.Int()
+      m = rest.Int()
+
+      @staticmethod
+      def validate_n(value):
+        if value == 13:
+          raise ValueError('unlucky')
+
+      @classmethod
+      def validate_m(cls, value):
+        if value == 13:
+          raise ValueError('unlucky %s' % cls.__name__)
+
+    class ChildSchema(HookSchema):
+      pass
+
+    schema = ChildSchema()
+    self.assertFalse(schema({'n': '13', 'm': '13'}))
+    self.assertEquals({'n': ['unlucky'], 'm': ['unlucky ChildSchema']},
+                      schema._errors)
+    self.assertTrue(schema({'n': '12', 'm': '12'}))
+
+    result = ChildSchema.validate_many([{'n': '13'}, {'n': '1'}])
+    self.assertEquals({0: {'n': ['unlucky']}}, result.errors)
+
+  def test_instances_do_not_share_values(self):
+    one = FriendSchema(name='One')
+    two = FriendSchema(name='Two')
+    self.assertEquals('One', one.name.get())
+    self.assertEquals('Two', two.name.get())
+    self.assertEquals(None, FriendSchema.name.get())
+
+  def test_concurrent_use_of_one_schema_class(self):
+    def roundtrip(n):
+      schema = FriendSchema()
+      if not schema({'name': 'friend-%d' % n, 'age': str(n)}):
+        return schema._errors
+      time.sleep(0)
+      return schema._get()
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+      results = list(pool.map(roundtrip, range(2000)))
+
+    for n, rep in enumerate(results):
+      self.assertEquals({'name': 'friend-%d' % n,
+                         'age':  n,
+                         '__namespace__': 'Friend'}, rep)
+
+  def test_validate_many(self):
+    class DogSchema(rest.Schema):
+      name   = rest.String(validators=[rest.nonempty])
+      pounds = rest.Int()
+
+    result = DogSchema.validate_many([
+      {'name': 'shibe', 'pounds': '20'},
+      {'name': '',      'pounds': '1500'},
+      {'name': 'dane',  'pounds': 'heavy'},
+      {'name': 'pug'},
+    ], start=1)
+
+    self.assertEquals(4, len(result))
+    self.assertEquals([1, 4], result.valid)
+    self.assertEquals({2: {'name': ['cannot be empty']},
+                       3: {'pounds': ['Invalid integer']}}, result.errors)
+    self.assertEquals({'name':   ['shibe', 'pug'],
+                       'pounds': [20, None]}, result.columns)
+
+  def test_validate_many_by_position(self):
+    class DogSchema(rest.Schema):
+      name   = rest.String(validators=[rest.nonempty])
+      pounds = rest.Int()
+
+    result = DogSchema.validate_many([
+      ['shibe', '20', 'extra'],
+      ['',      '1500'],
+      ['dane',  'heavy'],
+      ['pug',   ''],
+    ], start=1, fieldnames=('name', 'pounds'))
+
+    self.assertEquals([1, 4], result.valid)
+    self.assertEquals({2: {'name': ['cannot be empty']},
+                       3: {'pounds': ['Invalid integer']}}, result.errors)
+    self.assertEquals({'name':   ['shibe', 'pug'],
+                       'pounds': [20, 0]}, result.columns)
+
+  def test_validate_many_with_short_and_null_rows(self):
+    class DogSchema(rest.Schema):
+      name   = rest.String(validators=[rest.nonempty])
+      pounds = rest.Int()
+
+    result = DogSchema.validate_many([
+      ['shibe'],
+      ['pug', '8'],
+    ], start=1, fieldnames=('name', 'pounds'))
+    self.assertEquals([2], result.valid)
+    self.assertEquals({1: {'pounds': ['Invalid value None']}}, result.errors)
+
+    result = DogSchema.validate_many([{'name': None}])
+    self.assertEquals({0: {'name': ['Invalid value None',
+                                    'cannot be empty']}}, result.errors)
+
+  def test_call_with_none(self):
+    class DogSchema(rest.Schema):
+      name = rest.String()
+
+    dog = DogSchema()
+    self.assertFalse(dog({'name': None}))
+    self.assertEquals({'name': ['Invalid value None']}, dog._errors)
+
+  def test_call_with_pairs(self):
+    friend = FriendSchema()
+    self.assertTrue(friend([('name', 'dog'), ('age', '3')]))
+    self.assertEquals(3, friend.age.get())
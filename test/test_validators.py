@@ -0,0 +1,153 @@
+from __future__ import absolute_import
+from unittest import TestCase
+
+from rest import validators
+
+
+def unfused(vs, value):
+  errors = []
+  for validator in vs:
+    error = validator(value)
+    if error:
+      errors += error
+  return errors
+
+
+def shout(value):
+  if value == 'quiet':
+    return ['must be loud']
+
+
+class TestFuse(TestCase):
+
+  VALUES = [None, '', 'a', 'quiet', 'shibe', 'x' * 20, 0, 5, 11, -1, 3.5,
+            ['a'], [], 'red', ('red',), 'http://a.com', 'doge@example.com',
+            'shibe!', 'ftp://a.com', 'doge at example.com']
+
+  VALIDATORS = [
+    [],
+    [validators.required],
+    [validators.nonempty],
+    [validators.required, validators.nonempty],
+    [validators.length(min=2)],
+    [validators.length(max=5)],
+    [validators.length(min=2, max=5)],
+    [validators.length()],
+    [validators.number_range(min=0)],
+    [validators.number_range(max=10)],
+    [validators.number_range(min=0, max=10)],
+    [validators.regex(r'^[a-z]+$', 'lowercase only')],
+    [validators.url],
+    [validators.regex(r'[a-z]+', 'lowercase only', fullmatch=True)],
+    [validators.regex(r'[a-z]+', 'lowercase only',
+                      prefilter=lambda value: value != 'red')],
+    [validators.email],
+    [validators.multiple_choice(['red', 'blue'])],
+    [validators.multiple_choice(['red', ['a']])],
+    [validators.multiple_choice('red blue')],
+    [shout],
+    [validators.required, shout, validators.length(min=2, max=5),
+     validators.regex(r'^[a-z]+$', 'lowercase only')],
+  ]
+
+  def check(self, vs, value):
+    try:
+      expected = unfused(vs, value)
+    except Exception as e:
+      self.assertRaises(type(e), validators.fuse(vs), value)
+    else:
+      self.assertEquals(expected, validators.fuse(vs)(value),
+                        '%r with %r' % (vs, value))
+
+  def test_same_errors_as_each_validator(self):
+    for vs in self.VALIDATORS:
+      for value in self.VALUES:
+        self.check(vs, value)
+
+  def test_errors_in_order(self):
+    check = validators.fuse([validators.nonempty, shout, validators.required])
+    self.assertEquals(['cannot be empty', 'is required'], check(None))
+    self.assertEquals(['must be loud'], check('quiet'))
+
+  def test_code_shared_by_validators_of_the_same_shape(self):
+    first = validators.fuse([validators.required, validators.length(max=5),
+                             validators.regex(r'^[a-z]+$', 'lowercase only')])
+    second = validators.fuse([validators.required, validators.length(max=9),
+                              validators.regex(r'^[0-9]+$', 'digits only')])
+    self.assertTrue(first.__code__ is second.__code__)
+    self.assertEquals(['cannot be greater than 5 characters'],
+                      first('abcdefg'))
+    self.assertEquals(['digits only'], second('abcdefg'))
+
+    other = validators.fuse([validators.length(min=1, max=5)])
+    self.assertFalse(first.__code__ is other.__code__)
+
+  def test_fresh_list_each_call(self):
+    check = validators.fuse([validators.required])
+    check(None).append('changed')
+    self.assertEquals(['is required'], check(None))
+
+
+class TestRegex(TestCase):
+
+  def test_search(self):
+    lowercase = validators.regex(r'[a-z]+', 'lowercase only')
+    self.assertEquals(None, lowercase('shibe!'))
+    self.assertEquals(['lowercase only'], lowercase('SHIBE'))
+    self.assertEquals(None, lowercase(''))
+
+  def test_fullmatch(self):
+    lowercase = validators.regex(r'[a-z]+', 'lowercase only', fullmatch=True)
+    self.assertEquals(None, lowercase('shibe'))
+    self.assertEquals(['lowercase only'], lowercase('shibe!'))
+    self.assertEquals(['lowercase only'], lowercase('shibe\n'))
+
+  def test_fullmatch_alternation(self):
+    color = validators.regex(r'red|blue', 'not a color', fullmatch=True)
+    self.assertEquals(None, color('blue'))
+    self.assertEquals(['not a color'], color('redblue'))
+
+  def test_prefilter(self):
+    seen = []
+    def no_digits(value):
+      seen.append(value)
+      return not value.isdigit()
+
+    lowercase = validators.regex(r'[a-z]', 'lowercase only',
+                                 prefilter=no_digits)
+    self.assertEquals(['lowercase only'], lowercase('123'))
+    self.assertEquals(['lowercase only'], lowercase('ABC'))
+    self.assertEquals(None, lowercase('abc'))
+    self.assertEquals(['123', 'ABC', 'abc'], seen)
+
+  def test_url(self):
+    for value in ['http://example.com', 'https://example.com:8080/path',
+                  'http://127.0.0.1/']:
+      self.assertEquals(None, validators.url(value), value)
+    for value in ['example.com', 'ftp://example.com', 'http://',
+                  'HTTP://a.com', 'http://example']:
+      self.assertEquals(['must be a valid HTTP URL'], validators.url(value),
+                        value)
+
+  def test_email(self):
+    self.assertEquals(None, validators.email('doge@example.com'))
+    for value in ['doge', 'doge at example.com', 'doge@example', '@']:
+      self.assertEquals(['must be a valid email'], validators.email(value),
+                        value)
+
+  def test_non_strings_reach_the_regex(self):
+    self.assertRaises(TypeError, validators.url, 5)
+    self.assertRaises(TypeError, validators.email, 5)
+
+
+class TestMultipleChoice(TestCase):
+
+  def test_choices(self):
+    choice = validators.multiple_choice(['red', 'blue'])
+    self.assertEquals(None, choice('red'))
+    self.assertEquals(['Invalid selection green'], choice('green'))
+
+  def test_unhashable_value(self):
+    choice = validators.multiple_choice([['a'], 'red'])
+    self.assertEquals(None, choice(['a']))
+    self.assertEquals(['Invalid selection []'], choice([]))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+from unittest import TestCase
+
+from xml.etree import ElementTree
+
+from rest import xml_decode
+from rest.encoding import XmlEncoding
+from rest.limits import LimitExceeded
+
+
+DOCUMENTS = [
+  u'<a>text</a>',
+  u'<a />',
+  u'<a>   </a>',
+  u'<a x="1" />',
+  u'<a x="1">  text </a>',
+  u'<a><b>1</b></a>',
+  u'<a><b>1</b><b>2</b><b /><c>3</c></a>',
+  u'<a x="1" y="2">lead<b z="3">1</b>tail<b>2</b>more</a>',
+  u'<a><b><c><d>deep</d></c></b><b><c>x</c><c>y</c></b></a>',
+  u'<a xmlns:n="urn:n"><n:b n:attr="v">1</n:b></a>',
+  u'<a><!-- comment --><b>niño &amp; &#233;</b><![CDATA[<raw>]]></a>',
+]
+
+
+class TestDictBuilder(TestCase):
+
+  def test_matches_etree_to_dict(self):
+    codec = XmlEncoding('body')
+    for doc in DOCUMENTS:
+      expected = codec.etree_to_dict(ElementTree.XML(doc))
+      self.assertEquals(expected, xml_decode.loads(doc), doc)
+      self.assertEquals(expected, xml_decode.loads(doc.encode('utf-8')), doc)
+
+  def test_chunks(self):
+    doc = DOCUMENTS[7].encode('utf-8')
+    chunks = [doc[i:i + 3] for i in range(0, len(doc), 3)]
+    self.assertEquals(xml_decode.loads(doc), xml_decode.parse(chunks))
+
+  def test_deep_document(self):
+    depth = 5000
+    doc = '<a>' * depth + 'x' + '</a>' * depth
+    tree = xml_decode.loads(doc)
+    for i in range(depth - 1):
+      tree = tree['a']
+    self.assertEquals({'a': 'x'}, tree)
+
+  def test_malformed(self):
+    for doc in ['', '<a>', '<a></b>', 'text']:
+      with self.assertRaises(Exception):
+        xml_decode.loads(doc)
+
+  def test_too_deep(self):
+    xml_decode.parse([b'<a><b><c /></b></a>'], max_depth=3)
+    with self.assertRaises(LimitExceeded):
+      xml_decode.parse([b'<a><b><c /></b></a>'], max_depth=2)
+
+  def test_too_many_elements(self):
+    xml_decode.parse([b'<a><b /><b /></a>'], max_elements=3)
+    with self.assertRaises(LimitExceeded):
+      xml_decode.parse([b'<a><b /><b /><b /></a>'], max_elements=3)